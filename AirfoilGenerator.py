@@ -54,22 +54,28 @@ def generate_naca4(number, chord_length, num_points=100):
     return points_top + points_bot[::-1]
 
 
+def airfoil_outline(number, chord):
+    """
+    Outline in body coordinates, with the origin at the quarter-chord pivot.
+    """
+    x_offset = 0.25 * chord
+    return [(px - x_offset, py) for px, py in generate_naca4(number, chord)]
+
+
 def stamp_airfoil(obstacle_grid, number, cx, cy, chord, angle_deg=0):
     """
     Stamps the airfoil directly onto the boolean fluid grid.
+    Returns the transformed outline (upper surface LE->TE, then lower TE->LE).
     """
-    points = generate_naca4(number, chord)
+    points = airfoil_outline(number, chord)
 
     rad = np.radians(angle_deg)
     cos_a = np.cos(rad)
     sin_a = np.sin(rad)
 
     transformed_points = []
-    x_offset = 0.25 * chord
 
-    for px, py in points:
-        tx = px - x_offset
-        ty = py
+    for tx, ty in points:
         rx = tx * cos_a - ty * sin_a
         ry = tx * sin_a + ty * cos_a
         transformed_points.append((rx + cx, ry + cy))
@@ -85,3 +91,5 @@ def stamp_airfoil(obstacle_grid, number, cx, cy, chord, angle_deg=0):
 
     count = np.sum(mask)
     print(f"Stamped Airfoil with {count} pixels.")
+
+    return transformed_points
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+import SweepRunner
+from FluidTaichi import SOLVER_VERSION
+
+AIRFOILS = ["0012", "2412"]
+ANGLES = [0.0, 4.0, 8.0]
+
+BASE = SweepRunner.DEFAULT_CONFIG
+BASE_STEPS = BASE['sweep_steps']
+
+
+def at_fixed_re(width=None, lattice_speed=None, flow_throughs=1.0, **overrides):
+    """
+    Overrides that change the grid or lattice speed while holding the
+    defaults' chord Reynolds number and physical run time. The viscosity is
+    rescaled for Re. sweep_steps, spool_rate and smoothing_alpha are
+    rescaled by the steps per chord flow-through, so the spool-up, the filter
+    and the sweep (`flow_throughs` times the default length) last as long in
+    convective time. Grid spacing and Mach number still differ, and both
+    count towards the error.
+    """
+    w = width or BASE['width']
+    u = lattice_speed or BASE['lattice_speed']
+    re = BASE['lattice_speed'] * (BASE['width'] // 3) / BASE['viscosity']
+
+    # Steps per flow-through relative to the defaults
+    t = (w // 3) / (BASE['width'] // 3) * BASE['lattice_speed'] / u
+    out = {'width': w, 'height': w * BASE['height'] // BASE['width'],
+           'lattice_speed': u, 'viscosity': u * (w // 3) / re,
+           'sweep_steps': int(round(BASE_STEPS * flow_throughs * t)),
+           'spool_rate': BASE['spool_rate'] * (u / BASE['lattice_speed']) / t,
+           'smoothing_alpha': BASE['smoothing_alpha'] / t}
+    out.update(overrides)
+    return out
+
+
+# One axis varied at a time around the interactive defaults
+MATRIX = {
+    'baseline': {},
+    'grid_300': at_fixed_re(width=300),
+    'grid_450': at_fixed_re(width=450),
+    'grid_900': at_fixed_re(width=900),
+    'steps_25': {'sweep_steps': BASE_STEPS // 4},
+    'steps_50': {'sweep_steps': BASE_STEPS // 2},
+    'steps_200': {'sweep_steps': BASE_STEPS * 2},
+    'speed_05': at_fixed_re(lattice_speed=0.05),
+    'speed_15': at_fixed_re(lattice_speed=0.15),
+    'visc_010': {'viscosity': 0.010},
+    'visc_020': {'viscosity': 0.020},
+    'alpha_002': {'smoothing_alpha': 0.002},
+    'alpha_010': {'smoothing_alpha': 0.010},
+}
+
+# Finest settings, used to write the reference polar. It runs twice as many
+# flow-throughs as the longest setting above (steps_200)
+REFERENCE = at_fixed_re(width=1200, flow_throughs=4)
+
+CSV_COLUMNS = ['name', 'naca', 'cl_rms', 'cd_rms', 'cl_max_err', 'cd_max_err',
+               'wall_time', 'lattice_updates']
+
+
+def polar(code, overrides):
+    """
+    Runs one airfoil over ANGLES uncached (wall time is part of the result).
+    Returns ({angle: (cl, cd)}, wall_time, lattice_updates).
+    """
+    points, wall, updates = {}, 0.0, 0
+
+    # Untimed short run so kernel compilation for a new grid isn't billed
+    warm = SweepRunner.make_config(naca=code, angle=ANGLES[0], **overrides)
+    SweepRunner.run_point(dict(warm, sweep_steps=warm['steps_per_frame'] * 2))
+
+    for angle in ANGLES:
+        config = SweepRunner.make_config(naca=code, angle=angle, **overrides)
+        res = SweepRunner.run_point(config)
+        points[angle] = SweepRunner.coefficients(config, res['lift'], res['drag'])
+        wall += res['wall_time']
+        updates += res['lattice_updates']
+        print(f"  {code} {angle:+.1f}°: Cl={points[angle][0]:.4f} Cd={points[angle][1]:.5f} "
+              f"({res['wall_time']:.1f}s)")
+    return points, wall, updates
+
+
+def write_reference(path):
+    ref = {'solver_version': SOLVER_VERSION, 'overrides': REFERENCE, 'polars': {}}
+    for code in AIRFOILS:
+        print(f"Reference NACA {code}")
+        points, _, _ = polar(code, REFERENCE)
+        ref['polars'][code] = {str(a): list(v) for a, v in points.items()}
+    with open(path, "w") as fh:
+        json.dump(ref, fh, indent=2)
+    print(f"Wrote reference polar to {path}")
+
+
+def load_reference(path):
+    with open(path) as fh:
+        ref = json.load(fh)
+    if ref['solver_version'] != SOLVER_VERSION:
+        print(f"Warning: reference is from solver version {ref['solver_version']}, "
+              f"running {SOLVER_VERSION}")
+    return {code: {float(a): v for a, v in pts.items()} for code, pts in ref['polars'].items()}
+
+
+def polar_error(points, reference):
+    cl_err = np.array([points[a][0] - reference[a][0] for a in ANGLES])
+    cd_err = np.array([points[a][1] - reference[a][1] for a in ANGLES])
+    return {'cl_rms': float(np.sqrt(np.mean(cl_err**2))),
+            'cd_rms': float(np.sqrt(np.mean(cd_err**2))),
+            'cl_max_err': float(np.abs(cl_err).max()),
+            'cd_max_err': float(np.abs(cd_err).max())}
+
+
+def run_matrix(names, reference):
+    rows = []
+    for name in names:
+        print(f"[{name}]")
+        for code in AIRFOILS:
+            points, wall, updates = polar(code, MATRIX[name])
+            row = {'name': name, 'naca': code, 'wall_time': wall, 'lattice_updates': updates}
+            row.update(polar_error(points, reference[code]))
+            rows.append(row)
+    return rows
+
+
+def summarise(rows):
+    """
+    Collapses the per-airfoil rows into one entry per setting: the worst
+    error over both airfoils and the total cost.
+    """
+    out = {}
+    for r in rows:
+        s = out.setdefault(r['name'], {'name': r['name'], 'cl_rms': 0.0, 'cd_rms': 0.0,
+                                       'wall_time': 0.0, 'lattice_updates': 0})
+        s['cl_rms'] = max(s['cl_rms'], r['cl_rms'])
+        s['cd_rms'] = max(s['cd_rms'], r['cd_rms'])
+        s['wall_time'] += r['wall_time']
+        s['lattice_updates'] += r['lattice_updates']
+    return list(out.values())
+
+
+def pareto(summary):
+    """
+    Settings not dominated in (wall time, Cl error, Cd error), cheapest first.
+    """
+    keys = ('wall_time', 'cl_rms', 'cd_rms')
+    front = []
+    for s in summary:
+        dominated = any(all(o[k] <= s[k] for k in keys) and any(o[k] < s[k] for k in keys)
+                        for o in summary if o is not s)
+        if not dominated:
+            front.append(s)
+    return sorted(front, key=lambda s: s['wall_time'])
+
+
+def print_table(summary, front, cl_tol, cd_tol):
+    on_front = {s['name'] for s in front}
+    print(f"{'Setting':<11} {'Cl RMS':>8} {'Cd RMS':>8} {'Wall s':>8} {'MLUPs':>9}  Pareto  OK")
+    for s in sorted(summary, key=lambda s: s['wall_time']):
+        ok = s['cl_rms'] <= cl_tol and s['cd_rms'] <= cd_tol
+        print(f"{s['name']:<11} {s['cl_rms']:8.4f} {s['cd_rms']:8.5f} {s['wall_time']:8.1f} "
+              f"{s['lattice_updates'] / 1e6:9.0f}  {'*' if s['name'] in on_front else ' ':^6}  "
+              f"{'yes' if ok else 'no'}")
+
+    meets = [s for s in front if s['cl_rms'] <= cl_tol and s['cd_rms'] <= cd_tol]
+    if meets:
+        print(f"Cheapest setting within tolerance: {meets[0]['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Polar accuracy vs cost benchmark")
+    parser.add_argument("--only", nargs="+", choices=list(MATRIX), help="settings to run")
+    parser.add_argument("--reference", default="benchmark_reference.json")
+    parser.add_argument("--write-reference", action="store_true",
+                        help="run the finest settings and store them as the reference")
+    parser.add_argument("--out", default="benchmark.csv")
+    parser.add_argument("--cl-tol", type=float, default=0.02, help="Cl RMS error target")
+    parser.add_argument("--cd-tol", type=float, default=0.002, help="Cd RMS error target")
+    parser.add_argument("--gate", action="store_true",
+                        help="exit non-zero if the baseline misses the error targets")
+    args = parser.parse_args()
+
+    SweepRunner.init_backend()
+
+    if args.write_reference:
+        write_reference(args.reference)
+        return
+
+    reference = load_reference(args.reference)
+    names = args.only or (['baseline'] if args.gate else list(MATRIX))
+    rows = run_matrix(names, reference)
+
+    with open(args.out, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    summary = summarise(rows)
+    print_table(summary, pareto(summary), args.cl_tol, args.cd_tol)
+
+    if args.gate:
+        base = next((s for s in summary if s['name'] == 'baseline'), None)
+        if base is None:
+            print("Gate needs the baseline setting")
+            sys.exit(2)
+        if base['cl_rms'] > args.cl_tol or base['cd_rms'] > args.cd_tol:
+            print(f"GATE FAILED: baseline Cl RMS {base['cl_rms']:.4f} (tol {args.cl_tol}), "
+                  f"Cd RMS {base['cd_rms']:.5f} (tol {args.cd_tol})")
+            sys.exit(1)
+        print("Gate passed")
+
+
+if __name__ == "__main__":
+    main()
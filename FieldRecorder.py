@@ -0,0 +1,221 @@
+import json
+import os
+import queue
+import threading
+
+import taichi as ti
+import numpy as np
+
+
+FIELD_COMPONENTS = {'rho': 1, 'u': 2, 'curl': 1}
+
+
+@ti.data_oriented
+class FieldRecorder:
+    """
+    Snapshots fluid fields every N steps into pre-allocated host chunks and
+    hands full chunks to a background thread that writes them to disk.
+    """
+
+    def __init__(self, fluid, path, fields=('u', 'rho', 'curl'), every=100,
+                 decimate=1, region=None, chunk_len=32, num_buffers=3,
+                 compress=False):
+        for name in fields:
+            if name not in FIELD_COMPONENTS:
+                raise ValueError(f"Unknown field '{name}'")
+
+        self.fluid = fluid
+        self.path = path
+        self.fields = tuple(fields)
+        self.every = max(1, int(every))
+        self.decimate = max(1, int(decimate))
+        self.chunk_len = chunk_len
+        self.compress = compress
+
+        # Crop Region (x0, y0, x1, y1) in lattice cells
+        if region is None:
+            region = (0, 0, fluid.width, fluid.height)
+        x0, y0, x1, y1 = region
+        self.x0, self.y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(fluid.width, x1), min(fluid.height, y1)
+        self.nx = max(0, (x1 - self.x0 + self.decimate - 1) // self.decimate)
+        self.ny = max(0, (y1 - self.y0 + self.decimate - 1) // self.decimate)
+        if self.nx == 0 or self.ny == 0:
+            raise ValueError("Recording region is empty")
+
+        # Host Buffers (one set per in-flight chunk)
+        self.free_buffers = queue.Queue()
+        for _ in range(num_buffers):
+            self.free_buffers.put(self._alloc_chunk())
+
+        self.active = self.free_buffers.get()
+        self.active_steps = np.zeros(chunk_len, dtype=np.int64)
+        self.slot = 0
+
+        self.step_count = 0
+        self.chunk_count = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+
+        os.makedirs(path, exist_ok=True)
+        for name in self.fields:
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+
+        # Writer Thread
+        self.write_queue = queue.Queue()
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def _alloc_chunk(self):
+        bufs = {}
+        for name in self.fields:
+            comps = FIELD_COMPONENTS[name]
+            shape = (self.chunk_len, self.nx, self.ny)
+            if comps > 1:
+                shape += (comps,)
+            bufs[name] = np.zeros(shape, dtype=np.float32)
+        return bufs
+
+    @ti.kernel
+    def _gather_scalar(self, src: ti.template(), out: ti.types.ndarray()):
+        for a, b in ti.ndrange(self.nx, self.ny):
+            i = self.x0 + a * self.decimate
+            j = self.y0 + b * self.decimate
+            out[a, b] = src[i, j]
+
+    @ti.kernel
+    def _gather_vector(self, src: ti.template(), out: ti.types.ndarray()):
+        for a, b in ti.ndrange(self.nx, self.ny):
+            i = self.x0 + a * self.decimate
+            j = self.y0 + b * self.decimate
+            for c in ti.static(range(2)):
+                out[a, b, c] = src[i, j][c]
+
+    @ti.kernel
+    def _gather_curl(self, u: ti.template(), out: ti.types.ndarray()):
+        for a, b in ti.ndrange(self.nx, self.ny):
+            i = self.x0 + a * self.decimate
+            j = self.y0 + b * self.decimate
+            ip = min(i+1, self.fluid.width-1)
+            im = max(i-1, 0)
+            jp = min(j+1, self.fluid.height-1)
+            jm = max(j-1, 0)
+            uy_dx = (u[ip, j][1] - u[im, j][1]) * 0.5
+            ux_dy = (u[i, jp][0] - u[i, jm][0]) * 0.5
+            out[a, b] = uy_dx - ux_dy
+
+    def step(self):
+        """
+        Call once per solver step. Records a snapshot every `every` steps.
+        """
+        self.step_count += 1
+        if self.step_count % self.every == 0:
+            self.snapshot()
+
+    def snapshot(self):
+        if self.active is None:
+            # Writer is behind; drop rather than stall the solver
+            try:
+                self.active = self.free_buffers.get_nowait()
+            except queue.Empty:
+                self.frames_dropped += 1
+                return
+
+        self.fluid.update_macros()
+        k = self.slot
+        for name in self.fields:
+            out = self.active[name][k]
+            if name == 'rho':
+                self._gather_scalar(self.fluid.rho, out)
+            elif name == 'u':
+                self._gather_vector(self.fluid.u, out)
+            else:
+                self._gather_curl(self.fluid.u, out)
+        self.active_steps[k] = self.step_count
+        self.slot += 1
+
+        if self.slot == self.chunk_len:
+            self._submit()
+
+    def _submit(self):
+        if self.active is None or self.slot == 0:
+            return
+        self.write_queue.put(
+            (self.chunk_count, self.active, self.slot, self.active_steps.copy()))
+        self.chunk_count += 1
+        self.slot = 0
+        try:
+            self.active = self.free_buffers.get_nowait()
+        except queue.Empty:
+            self.active = None
+
+    def _writer_loop(self):
+        while True:
+            job = self.write_queue.get()
+            if job is None:
+                break
+
+            idx, bufs, count, steps = job
+            for name in self.fields:
+                data = bufs[name][:count]
+                fname = os.path.join(self.path, name, f"chunk_{idx:05d}")
+                if self.compress:
+                    np.savez_compressed(fname + ".npz", data=data, steps=steps[:count])
+                else:
+                    np.save(fname + ".npy", data)
+                    np.save(fname + "_steps.npy", steps[:count])
+
+            self.frames_written += count
+            self.free_buffers.put(bufs)
+            self._write_index()
+
+    def _write_index(self):
+        index = {
+            'fields': list(self.fields),
+            'shape': [self.nx, self.ny],
+            'every': self.every,
+            'decimate': self.decimate,
+            'origin': [self.x0, self.y0],
+            'chunk_len': self.chunk_len,
+            'compressed': self.compress,
+            'frames': self.frames_written,
+            'dropped': self.frames_dropped,
+        }
+        with open(os.path.join(self.path, "index.json"), "w") as fh:
+            json.dump(index, fh, indent=2)
+
+    def close(self):
+        self._submit()
+        self.write_queue.put(None)
+        self.writer.join()
+        self._write_index()
+        print(f"Recorded {self.frames_written} frames to {self.path} "
+              f"({self.frames_dropped} dropped)")
+
+
+def load_recording(path, name):
+    """
+    Returns the recorded steps and a list of per-chunk arrays for one field.
+    Uncompressed chunks are memory-mapped rather than read into RAM.
+    """
+    with open(os.path.join(path, "index.json")) as fh:
+        index = json.load(fh)
+
+    folder = os.path.join(path, name)
+    chunks, steps = [], []
+    for i in range(index['frames'] // index['chunk_len'] + 1):
+        fname = os.path.join(folder, f"chunk_{i:05d}")
+        if index['compressed']:
+            if not os.path.exists(fname + ".npz"):
+                break
+            with np.load(fname + ".npz") as z:
+                chunks.append(z['data'])
+                steps.append(z['steps'])
+        else:
+            if not os.path.exists(fname + ".npy"):
+                break
+            chunks.append(np.load(fname + ".npy", mmap_mode='r'))
+            steps.append(np.load(fname + "_steps.npy"))
+
+    steps = np.concatenate(steps) if steps else np.zeros(0, dtype=np.int64)
+    return steps, chunks
@@ -1,12 +1,58 @@
 import taichi as ti
 import numpy as np
 
+# Bump whenever kernel numerics change so cached results are invalidated
+SOLVER_VERSION = 1
+
+OUTLETS = ("periodic", "zero_gradient", "convective")
+WALLS = ("periodic", "slip")
+
+# Upper bound on wall-adjacent cells tracked by the surface sampler
+SURFACE_CAPACITY = 4096
+
+# Upper bound on registered probe points, and default ring length
+PROBE_CAPACITY = 256
+PROBE_HISTORY = 4096
+
+# Upper bound on outline vertices for on-device restamping
+BODY_CAPACITY = 512
+
+# Link with the same ex and flipped ey (specular reflection off a slip wall)
+MIRROR_Y = [0, 1, 4, 3, 2, 8, 7, 6, 5]
+
+
+@ti.func
+def sample_bilinear(field, x, y, width, height):
+    """
+    Bilinear read of a 2D field at fractional cell-centre coordinates,
+    clamped to the grid.
+    """
+    x = ti.min(ti.max(x, 0.0), width - 1.0)
+    y = ti.min(ti.max(y, 0.0), height - 1.0)
+    i0 = ti.min(int(x), width - 2)
+    j0 = ti.min(int(y), height - 2)
+    tx = x - i0
+    ty = y - j0
+    return (field[i0, j0] * (1.0 - tx) * (1.0 - ty) +
+            field[i0 + 1, j0] * tx * (1.0 - ty) +
+            field[i0, j0 + 1] * (1.0 - tx) * ty +
+            field[i0 + 1, j0 + 1] * tx * ty)
+
 
 @ti.data_oriented
 class FluidTaichi:
-    def __init__(self, width, height, viscosity=0.02):
+    def __init__(self, width, height, viscosity=0.02, outlet="periodic", walls="periodic",
+                 sparse=False, block_size=16, sparse_tol=0.02, probe_history=PROBE_HISTORY,
+                 lazy_macros=False, stats_every=0):
+        if outlet not in OUTLETS:
+            raise ValueError(f"outlet must be one of {OUTLETS}")
+        if walls not in WALLS:
+            raise ValueError(f"walls must be one of {WALLS}")
+
         self.width = width
         self.height = height
+        self.outlet = outlet
+        self.walls = walls
 
         # Fields
         self.rho = ti.field(dtype=float, shape=(width, height))
@@ -19,9 +65,66 @@ class FluidTaichi:
         self.drag_val = ti.field(dtype=float, shape=())
         self.lift_val = ti.field(dtype=float, shape=())
         self.max_v_sq = ti.field(dtype=float, shape=())
+        self.u_in = ti.field(dtype=float, shape=())
 
         self.rgb_buf = ti.Vector.field(3, dtype=ti.u8, shape=(width, height))
 
+        # Lazy Macroscopics
+        # rho/u are only refreshed by update_macros(), so steps skip those
+        # stores; consumers must call update_macros() before reading them.
+        self.lazy_macros = lazy_macros
+        self.macros_stale = False
+
+        # Flow Statistics
+        # Running sums of rho, u, u components squared (and ux*uy) and
+        # vorticity, sampled every stats_every steps (0 disables them)
+        self.stats_every = stats_every
+        if stats_every > 0:
+            self.stat_rho = ti.Vector.field(2, dtype=float, shape=(width, height))
+            self.stat_u = ti.Vector.field(2, dtype=float, shape=(width, height))
+            self.stat_uu = ti.Vector.field(3, dtype=float, shape=(width, height))
+            self.stat_curl = ti.Vector.field(2, dtype=float, shape=(width, height))
+            self.stat_count = ti.field(dtype=int, shape=())
+
+        # Surface Sampler (allocated on first build_surface_index)
+        self.n_surface = 0
+        self.surface_xc = None
+        self.surface_upper = None
+
+        # Moving Body (allocated on first set_body)
+        self.n_body = 0
+        self.body_pivot = (0.0, 0.0)
+
+        # Probes (allocated on first add_probe)
+        self.probe_history = probe_history
+        self.probe_every = 1
+        self.probe_points = []
+        self.probe_xy = None
+        self.probe_written = 0
+        self.probe_drained = 0
+
+        # Block-Sparse Stepping
+        # Blocks of block_size^2 cells are skipped when their whole halo is
+        # solid, or once the inlet is steady and they and their neighbours
+        # sit within sparse_tol * u_in of free-stream equilibrium. Idle blocks
+        # are held at exactly that state, so f stays dense and valid for the
+        # active blocks streaming from them.
+        self.sparse = sparse
+        self.block_size = block_size
+        self.sparse_tol = sparse_tol
+        self.sparse_u_in = None
+        self.sparse_idle = False
+        self.activity_stale = True
+        self.step_count = 0
+        if sparse:
+            nbx = (width + block_size - 1) // block_size
+            nby = (height + block_size - 1) // block_size
+            self.nbx, self.nby = nbx, nby
+            self.block_dev = ti.field(dtype=float, shape=(nbx, nby))
+            self.block_fluid = ti.field(dtype=int, shape=(nbx, nby))
+            self.block_on = ti.field(dtype=int, shape=(nbx, nby))
+            self.n_blocks = ti.field(dtype=int, shape=())
+
         # Constants
         self.w = ti.Vector([4/9, 1/9, 1/9, 1/9, 1/9, 1/36, 1/36, 1/36, 1/36])
         self.ex = ti.Vector([0, 1, 0, -1, 0, 1, -1, -1, 1])
@@ -33,6 +136,110 @@ class FluidTaichi:
     def reset(self):
         self.cylinder.fill(0)
         self.init_flow()
+        self.step_count = 0
+        self.activity_stale = True
+        self.reset_statistics()
+
+    def set_obstacle(self, mask):
+        self.cylinder.from_numpy(mask.astype(np.int32))
+        self.activity_stale = True
+
+    def set_body(self, outline, cx, cy):
+        """
+        Registers a rigid body for rotate_body: `outline` is the polygon in
+        body coordinates (e.g. airfoil_outline), pivoting about (cx, cy).
+        """
+        pts = np.asarray(outline, dtype=np.float32)
+        if len(pts) > BODY_CAPACITY:
+            raise ValueError(f"Outline has more than {BODY_CAPACITY} vertices")
+
+        if self.n_body == 0:
+            self.body_pts = ti.Vector.field(2, dtype=float, shape=BODY_CAPACITY)
+            self.mask_new = ti.field(dtype=int, shape=(self.width, self.height))
+            self.body_radius = ti.field(dtype=float, shape=())
+
+        padded = np.zeros((BODY_CAPACITY, 2), dtype=np.float32)
+        padded[:len(pts)] = pts
+        self.body_pts.from_numpy(padded)
+        self.body_radius[None] = float(np.linalg.norm(pts, axis=1).max()) + 2.0
+        self.n_body = len(pts)
+        self.body_pivot = (cx, cy)
+
+    @ti.kernel
+    def restamp_kernel(self, n: int, cx: float, cy: float, angle: float):
+        cos_a, sin_a = ti.cos(angle), ti.sin(angle)
+        r = self.body_radius[None]
+
+        # New mask: even-odd test of each cell against the rotated outline.
+        # Cells within half a cell of the outline count as solid too, which
+        # matches the pygame fill in stamp_airfoil to a few cells.
+        for i, j in self.mask_new:
+            dx, dy = i + 0.5 - cx, j + 0.5 - cy
+            inside = 0
+            if dx * dx + dy * dy < r * r:
+                p = ti.Vector([dx * cos_a + dy * sin_a, -dx * sin_a + dy * cos_a])
+                edge_sq = 1e9
+                for e in range(n):
+                    a = self.body_pts[e]
+                    b = self.body_pts[(e + 1) % n]
+                    if (a[1] > p[1]) != (b[1] > p[1]):
+                        x_cross = a[0] + (p[1] - a[1]) * (b[0] - a[0]) / (b[1] - a[1])
+                        if p[0] < x_cross:
+                            inside = 1 - inside
+                    ab = b - a
+                    t = ti.min(ti.max((p - a).dot(ab) / ti.max(ab.norm_sqr(), 1e-12), 0.0), 1.0)
+                    edge_sq = ti.min(edge_sq, (p - a - t * ab).norm_sqr())
+                if edge_sq < 0.25:
+                    inside = 1
+            self.mask_new[i, j] = inside
+
+        # Uncovered cells start from the mean state of their old fluid
+        # neighbours; covered cells are reset like stamped ones
+        for i, j in self.mask_new:
+            if self.cylinder[i, j] == 1 and self.mask_new[i, j] == 0:
+                rho_sum = 0.0
+                u_sum = ti.Vector([0.0, 0.0])
+                count = 0
+                for k in ti.static(range(1, 9)):
+                    ni = ti.min(ti.max(i + self.ex[k], 0), self.width - 1)
+                    nj = ti.min(ti.max(j + self.ey[k], 0), self.height - 1)
+                    if self.cylinder[ni, nj] == 0 and self.mask_new[ni, nj] == 0:
+                        rho_n, u_n = self.moments(self.f[ni, nj])
+                        rho_sum += rho_n
+                        u_sum += u_n
+                        count += 1
+
+                rho = 1.0
+                u_vec = ti.Vector([0.0, 0.0])
+                if count > 0:
+                    rho = rho_sum / count
+                    u_vec = u_sum / count
+                for k in ti.static(range(9)):
+                    self.f[i, j][k] = self.feq(k, rho, u_vec)
+                    self.f_new[i, j][k] = self.f[i, j][k]
+                self.rho[i, j] = rho
+                self.u[i, j] = u_vec
+
+            elif self.cylinder[i, j] == 0 and self.mask_new[i, j] == 1:
+                for k in ti.static(range(9)):
+                    self.f[i, j][k] = self.w[k]
+                    self.f_new[i, j][k] = self.w[k]
+                self.u[i, j] = ti.Vector([0.0, 0.0])
+
+        for i, j in self.mask_new:
+            self.cylinder[i, j] = self.mask_new[i, j]
+
+    def rotate_body(self, angle_deg):
+        """
+        Re-rasterizes the registered body at `angle_deg` on the device. Cells
+        the body leaves are refilled from their fluid neighbours. The wall is
+        treated as stationary, which suits slow (quasi-steady) rotation.
+        """
+        if self.n_body == 0:
+            return
+        self.restamp_kernel(self.n_body, self.body_pivot[0], self.body_pivot[1],
+                            float(np.radians(angle_deg)))
+        self.activity_stale = True
 
     @ti.kernel
     def init_flow(self):
@@ -45,6 +252,7 @@ class FluidTaichi:
 
     @ti.kernel
     def set_inlet(self, u_speed: float):
+        self.u_in[None] = u_speed
         for j in range(self.height):
             u_vec = ti.Vector([u_speed, 0.0])
             u_sq = u_speed**2
@@ -54,75 +262,580 @@ class FluidTaichi:
                 self.f[0, j][k] = feq
                 self.f[1, j][k] = feq
 
+    @ti.func
+    def feq(self, k: ti.template(), rho, u_vec):
+        eu = u_vec.dot(ti.Vector([self.ex[k], self.ey[k]]))
+        return self.w[k] * rho * (1.0 + 3.0*eu + 4.5*eu**2 - 1.5*u_vec.norm_sqr())
+
+    @ti.func
+    def moments(self, f_vec):
+        rho = f_vec.sum()
+        u_vec = ti.Vector([0.0, 0.0])
+        for k in ti.static(range(9)):
+            u_vec += ti.Vector([self.ex[k], self.ey[k]]) * f_vec[k]
+        if rho > 0:
+            u_vec /= rho
+        return rho, u_vec
+
+    @ti.kernel
+    def stream_interior(self):
+        # No neighbour can leave the grid here, so no wrapping or clamping
+        if ti.static(self.sparse):
+            B = ti.static(self.block_size)
+            for bi, bj in self.block_on:
+                if self.block_on[bi, bj] == 1:
+                    for a, b in ti.ndrange(B, B):
+                        i, j = bi * B + a, bj * B + b
+                        if 0 < i < self.width - 1 and 0 < j < self.height - 1:
+                            for k in ti.static(range(9)):
+                                self.f_new[i, j][k] = self.f[i - self.ex[k], j - self.ey[k]][k]
+        else:
+            for i, j in ti.ndrange((1, self.width - 1), (1, self.height - 1)):
+                for k in ti.static(range(9)):
+                    self.f_new[i, j][k] = self.f[i - self.ex[k], j - self.ey[k]][k]
+
+    @ti.func
+    def stream_edge_cell(self, i, j):
+        for k in ti.static(range(9)):
+            src_i = i - self.ex[k]
+            src_j = j - self.ey[k]
+
+            # Walls (Y)
+            mirrored = False
+            if src_j < 0 or src_j >= self.height:
+                if ti.static(self.walls == "periodic"):
+                    src_j = (src_j + self.height) % self.height
+                else:
+                    src_j = j
+                    mirrored = True
+
+            # Inlet / Outlet (X)
+            inlet = False
+            outlet = False
+            if src_i < 0:
+                if ti.static(self.outlet == "periodic"):
+                    src_i += self.width
+                else:
+                    src_i = 0
+                    inlet = True
+            elif src_i >= self.width:
+                if ti.static(self.outlet == "periodic"):
+                    src_i -= self.width
+                else:
+                    src_i = self.width - 1
+                    outlet = True
+
+            val = self.f[src_i, src_j][k]
+            if mirrored:
+                val = self.f[src_i, src_j][ti.static(MIRROR_Y[k])]
+
+            if inlet:
+                val = self.feq(k, 1.0, ti.Vector([self.u_in[None], 0.0]))
+            elif outlet:
+                # Zero velocity gradient with the density pinned to 1
+                # (non-equilibrium extrapolation from the upstream column)
+                f_nb = self.f[self.width - 2, src_j]
+                rho_nb, u_nb = self.moments(f_nb)
+                val = self.feq(k, 1.0, u_nb) + \
+                    (f_nb[k] - self.feq(k, rho_nb, u_nb))
+                if ti.static(self.outlet == "convective"):
+                    c = self.u_in[None]
+                    val = (self.f_new[i, j][k] + c * val) / (1.0 + c)
+
+            self.f_new[i, j][k] = val
+
     @ti.kernel
-    def step_kernel(self):
+    def stream_boundary(self):
+        for i, s in ti.ndrange(self.width, 2):
+            self.stream_edge_cell(i, s * (self.height - 1))
+        for j, s in ti.ndrange((1, self.height - 1), 2):
+            self.stream_edge_cell(s * (self.width - 1), j)
+
+    @ti.func
+    def accumulate_stats(self, i, j, rho, u_vec, src: ti.template()):
+        # Vorticity from the neighbours' moments, as in render_visuals
+        ip = ti.min(i+1, self.width-1)
+        im = ti.max(i-1, 0)
+        jp = ti.min(j+1, self.height-1)
+        jm = ti.max(j-1, 0)
+        uy_dx = (self.moment_u(ip, j, src)[1] - self.moment_u(im, j, src)[1]) * 0.5
+        ux_dy = (self.moment_u(i, jp, src)[0] - self.moment_u(i, jm, src)[0]) * 0.5
+        curl = uy_dx - ux_dy
+
+        self.stat_rho[i, j] += ti.Vector([rho, rho * rho])
+        self.stat_u[i, j] += u_vec
+        self.stat_uu[i, j] += ti.Vector([u_vec[0]**2, u_vec[1]**2, u_vec[0] * u_vec[1]])
+        self.stat_curl[i, j] += ti.Vector([curl, curl * curl])
+
+    @ti.func
+    def moment_u(self, i, j, src: ti.template()):
+        u_vec = ti.Vector([0.0, 0.0])
+        if self.cylinder[i, j] == 0:
+            _, u_vec = self.moments(src[i, j])
+        return u_vec
+
+    @ti.func
+    def collide_cell(self, i, j, stats):
+        # Returns this cell's (drag, lift, |u|^2) for the caller to reduce
+        out = ti.Vector([0.0, 0.0, 0.0])
+        if self.cylinder[i, j] == 1:
+            # Bounce Back
+            for k in ti.static(range(9)):
+                inv = k
+                if k == 1:
+                    inv = 3
+                elif k == 2:
+                    inv = 4
+                elif k == 3:
+                    inv = 1
+                elif k == 4:
+                    inv = 2
+                elif k == 5:
+                    inv = 7
+                elif k == 6:
+                    inv = 8
+                elif k == 7:
+                    inv = 5
+                elif k == 8:
+                    inv = 6
+
+                val_in = self.f_new[i, j][k]
+                self.f[i, j][inv] = val_in
+
+                if val_in > 0:
+                    out[0] += 2.0 * val_in * self.ex[k]
+                    out[1] += 2.0 * val_in * self.ey[k]
+
+            if ti.static(not self.lazy_macros):
+                self.u[i, j] = ti.Vector([0.0, 0.0])
+
+        else:
+            f_vec = self.f_new[i, j]
+            rho = f_vec.sum()
+            u_vec = ti.Vector([0.0, 0.0])
+
+            for k in ti.static(range(9)):
+                u_vec += ti.Vector([self.ex[k], self.ey[k]]) * f_vec[k]
+
+            if rho > 0:
+                u_vec /= rho
+
+            u_sq = u_vec.norm_sqr()
+            out[2] = u_sq
+
+            for k in ti.static(range(9)):
+                eu = u_vec.dot(ti.Vector([self.ex[k], self.ey[k]]))
+                feq = self.w[k] * rho * \
+                    (1.0 + 3.0*eu + 4.5*eu**2 - 1.5*u_sq)
+                self.f[i, j][k] = f_vec[k] + self.omega * (feq - f_vec[k])
+
+            if ti.static(not self.lazy_macros):
+                self.rho[i, j] = rho
+                self.u[i, j] = u_vec
+
+            # Sparse solvers skip idle cells, so they sample in stats_kernel
+            if ti.static(self.stats_every > 0 and not self.sparse):
+                if stats:
+                    self.accumulate_stats(i, j, rho, u_vec, self.f_new)
+        return out
+
+    @ti.kernel
+    def collide_kernel(self, stats: int):
         self.drag_val[None] = 0.0
         self.lift_val[None] = 0.0
         self.max_v_sq[None] = 0.0
 
-        # Streaming
+        # Collision & Forces
+        if ti.static(self.sparse):
+            B = ti.static(self.block_size)
+            for bi, bj in self.block_on:
+                if self.block_on[bi, bj] == 1:
+                    # Reduce per block so the globals see one update each
+                    acc = ti.Vector([0.0, 0.0, 0.0])
+                    for a, b in ti.ndrange(B, B):
+                        i, j = bi * B + a, bj * B + b
+                        if i < self.width and j < self.height:
+                            out = self.collide_cell(i, j, stats)
+                            acc[0] += out[0]
+                            acc[1] += out[1]
+                            acc[2] = max(acc[2], out[2])
+                    self.drag_val[None] += acc[0]
+                    self.lift_val[None] += acc[1]
+                    ti.atomic_max(self.max_v_sq[None], acc[2])
+        else:
+            for i, j in self.f_new:
+                out = self.collide_cell(i, j, stats)
+                if self.cylinder[i, j] == 1:
+                    self.drag_val[None] += out[0]
+                    self.lift_val[None] += out[1]
+                else:
+                    ti.atomic_max(self.max_v_sq[None], out[2])
+
+        if ti.static(self.stats_every > 0):
+            if stats:
+                self.stat_count[None] += 1
+
+    @ti.kernel
+    def stats_kernel(self):
         for i, j in self.f:
-            for k in ti.static(range(9)):
-                prev_x = (i - self.ex[k] + self.width) % self.width
-                prev_y = (j - self.ey[k] + self.height) % self.height
-                self.f_new[i, j][k] = self.f[prev_x, prev_y][k]
+            if self.cylinder[i, j] == 0:
+                rho, u_vec = self.moments(self.f[i, j])
+                self.accumulate_stats(i, j, rho, u_vec, self.f)
 
-        # Collision & Forces
-        for i, j in self.f_new:
-            if self.cylinder[i, j] == 1:
-                # Bounce Back
-                for k in ti.static(range(9)):
-                    inv = k
-                    if k == 1:
-                        inv = 3
-                    elif k == 2:
-                        inv = 4
-                    elif k == 3:
-                        inv = 1
-                    elif k == 4:
-                        inv = 2
-                    elif k == 5:
-                        inv = 7
-                    elif k == 6:
-                        inv = 8
-                    elif k == 7:
-                        inv = 5
-                    elif k == 8:
-                        inv = 6
-
-                    val_in = self.f_new[i, j][k]
-                    self.f[i, j][inv] = val_in
-
-                    if val_in > 0:
-                        dx, dy = self.ex[k], self.ey[k]
-                        ti.atomic_add(self.drag_val[None], 2.0 * val_in * dx)
-                        ti.atomic_add(self.lift_val[None], 2.0 * val_in * dy)
+    def reset_statistics(self):
+        """
+        Restarts the averaging window.
+        """
+        if self.stats_every > 0:
+            self.stat_rho.fill(0)
+            self.stat_u.fill(0)
+            self.stat_uu.fill(0)
+            self.stat_curl.fill(0)
+            self.stat_count[None] = 0
 
-                self.u[i, j] = ti.Vector([0.0, 0.0])
+    def export_statistics(self):
+        """
+        Returns mean and RMS fluctuation arrays since the last
+        reset_statistics: {'samples', 'rho_mean', 'rho_rms', 'u_mean',
+        'u_rms', 'uv', 'curl_mean', 'curl_rms'}. uv is the <u'v'> covariance.
+        """
+        if self.stats_every == 0 or self.stat_count[None] == 0:
+            return None
 
-            else:
-                f_vec = self.f_new[i, j]
-                rho = f_vec.sum()
-                u_vec = ti.Vector([0.0, 0.0])
+        n = self.stat_count[None]
+        rho = self.stat_rho.to_numpy() / n
+        u = self.stat_u.to_numpy() / n
+        uu = self.stat_uu.to_numpy() / n
+        curl = self.stat_curl.to_numpy() / n
 
-                for k in ti.static(range(9)):
-                    u_vec += ti.Vector([self.ex[k], self.ey[k]]) * f_vec[k]
+        def rms(ms, mean):
+            return np.sqrt(np.maximum(ms - mean**2, 0.0))
+
+        return {
+            'samples': n,
+            'rho_mean': rho[..., 0], 'rho_rms': rms(rho[..., 1], rho[..., 0]),
+            'u_mean': u, 'u_rms': rms(uu[..., :2], u),
+            'uv': uu[..., 2] - u[..., 0] * u[..., 1],
+            'curl_mean': curl[..., 0], 'curl_rms': rms(curl[..., 1], curl[..., 0]),
+        }
 
-                if rho > 0:
-                    u_vec /= rho
+    @ti.kernel
+    def macros_kernel(self):
+        # Collision conserves mass and momentum, so the post-collision f
+        # gives the same moments the step would have stored
+        for i, j in self.f:
+            if self.cylinder[i, j] == 1:
+                self.u[i, j] = ti.Vector([0.0, 0.0])
+            else:
+                self.rho[i, j], self.u[i, j] = self.moments(self.f[i, j])
 
-                u_sq = u_vec.norm_sqr()
-                ti.atomic_max(self.max_v_sq[None], u_sq)
+    def update_macros(self):
+        """
+        Brings rho and u up to date. A no-op unless lazy_macros is set and
+        the solver has stepped since the last call.
+        """
+        if self.macros_stale:
+            self.macros_kernel()
+            self.macros_stale = False
 
+    @ti.kernel
+    def prolongate_kernel(self, src: ti.template(), ox: float, oy: float,
+                          scale: float, alpha: float):
+        for i, j in self.f:
+            if self.cylinder[i, j] == 1:
                 for k in ti.static(range(9)):
-                    eu = u_vec.dot(ti.Vector([self.ex[k], self.ey[k]]))
-                    feq = self.w[k] * rho * \
-                        (1.0 + 3.0*eu + 4.5*eu**2 - 1.5*u_sq)
-                    self.f[i, j][k] = f_vec[k] + self.omega * (feq - f_vec[k])
+                    self.f[i, j][k] = self.w[k]
+                self.rho[i, j] = 1.0
+                self.u[i, j] = ti.Vector([0.0, 0.0])
+            else:
+                # Bilinear over the source's fluid cells only, so masks that
+                # were rasterized separately at each resolution still line up
+                x = ti.min(ti.max(ox + (i + 0.5) / scale - 0.5, 0.0), src.width - 1.0)
+                y = ti.min(ti.max(oy + (j + 0.5) / scale - 0.5, 0.0), src.height - 1.0)
+                i0 = ti.min(int(x), src.width - 2)
+                j0 = ti.min(int(y), src.height - 2)
+                tx, ty = x - i0, y - j0
+
+                f_sum = ti.Vector([0.0] * 9)
+                w_sum = 0.0
+                for di, dj in ti.static(ti.ndrange(2, 2)):
+                    wt = (tx if di else 1.0 - tx) * (ty if dj else 1.0 - ty)
+                    if src.cylinder[i0 + di, j0 + dj] == 0:
+                        f_sum += src.f[i0 + di, j0 + dj] * wt
+                        w_sum += wt
+
+                rho = 1.0
+                u_vec = ti.Vector([0.0, 0.0])
+                if w_sum > 1e-6:
+                    f_src = f_sum / w_sum
+                    rho, u_vec = self.moments(f_src)
+                    for k in ti.static(range(9)):
+                        feq = self.feq(k, rho, u_vec)
+                        self.f[i, j][k] = feq + alpha * (f_src[k] - feq)
+                else:
+                    for k in ti.static(range(9)):
+                        self.f[i, j][k] = self.w[k]
 
                 self.rho[i, j] = rho
                 self.u[i, j] = u_vec
 
+    def prolongate_from(self, src, origin=(0.0, 0.0), scale=None, include_neq=True):
+        """
+        Initialises this solver from a (usually coarser) solved FluidTaichi.
+        Cell (i, j) here maps to src cell-centre coordinates
+        origin + (i + 0.5) / scale - 0.5; by default the two grids span the
+        same tunnel. Call after this solver's obstacle has been set.
+        """
+        if scale is None:
+            scale = self.width / src.width
+
+        # Post-collision non-equilibrium scales with tau and the time step
+        tau_src, tau_dst = 1.0 / src.omega, 1.0 / self.omega
+        alpha = 0.0
+        if include_neq and abs(tau_src - 1.0) > 1e-6:
+            alpha = (tau_dst - 1.0) / (scale * (tau_src - 1.0))
+
+        self.prolongate_kernel(src, origin[0], origin[1], scale, alpha)
+        self.f_new.copy_from(self.f)
+        self.activity_stale = True
+
+    def build_surface_index(self, polygon):
+        """
+        Indexes the fluid cells touching the current obstacle mask, ordered
+        along the upper (lift-side) then lower surface of `polygon` (the
+        outline returned by stamp_airfoil) from leading to trailing edge.
+        """
+        pts = np.asarray(polygon, dtype=np.float64)
+        half = len(pts) // 2
+        le, te = pts[0], pts[half - 1]
+        chord_vec = te - le
+        chord_sq = chord_vec.dot(chord_vec)
+
+        # Wall-adjacent fluid cells
+        solid = self.cylinder.to_numpy().astype(bool)
+        pad = np.pad(solid, 1)
+        near = np.zeros_like(solid)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                near |= pad[1+di:self.width+1+di, 1+dj:self.height+1+dj]
+        cells = np.argwhere(near & ~solid)
+        centres = cells + 0.5
+
+        # Closest point on the outline for every cell
+        a = pts
+        b = np.roll(pts, -1, axis=0)
+        ab = b - a
+        t = ((centres[:, None, :] - a[None]) * ab[None]).sum(-1) / \
+            np.maximum((ab * ab).sum(-1), 1e-12)[None]
+        t = np.clip(t, 0.0, 1.0)
+        closest = a[None] + t[..., None] * ab[None]
+        dist = np.linalg.norm(centres[:, None, :] - closest, axis=-1)
+        seg = dist.argmin(axis=1)
+        keep = dist[np.arange(len(cells)), seg] < 2.0
+
+        idx = np.nonzero(keep)[0]
+        cells, centres, seg = cells[idx], centres[idx], seg[idx]
+        q = closest[idx, seg]
+
+        normal = centres - q
+        normal /= np.maximum(np.linalg.norm(normal, axis=1, keepdims=True), 1e-12)
+        tangent = np.stack([-normal[:, 1], normal[:, 0]], axis=1)
+        tangent *= np.where((tangent @ chord_vec) < 0, -1.0, 1.0)[:, None]
+
+        xc = ((q - le) @ chord_vec) / chord_sq
+        # Screen y points down, so the outline's second half (geometric
+        # lower surface) is the one facing the reported lift direction
+        upper = seg >= half - 1
+
+        # Upper surface LE->TE, then lower surface LE->TE
+        order = np.lexsort((xc, ~upper))[:SURFACE_CAPACITY]
+        n = len(order)
+
+        if self.surface_xc is None:
+            self.surf_ij = ti.Vector.field(2, dtype=int, shape=SURFACE_CAPACITY)
+            self.surf_n = ti.Vector.field(2, dtype=float, shape=SURFACE_CAPACITY)
+            self.surf_t = ti.Vector.field(2, dtype=float, shape=SURFACE_CAPACITY)
+            self.surf_cp = ti.field(dtype=float, shape=SURFACE_CAPACITY)
+            self.surf_cf = ti.field(dtype=float, shape=SURFACE_CAPACITY)
+            self.surf_cp_sum = ti.field(dtype=float, shape=SURFACE_CAPACITY)
+            self.surf_cf_sum = ti.field(dtype=float, shape=SURFACE_CAPACITY)
+            self.surf_count = ti.field(dtype=int, shape=())
+
+        def padded(arr, dtype):
+            out = np.zeros((SURFACE_CAPACITY,) + arr.shape[1:], dtype=dtype)
+            out[:n] = arr[order]
+            return out
+
+        self.surf_ij.from_numpy(padded(cells, np.int32))
+        self.surf_n.from_numpy(padded(normal, np.float32))
+        self.surf_t.from_numpy(padded(tangent, np.float32))
+
+        self.n_surface = n
+        self.surface_xc = xc[order]
+        self.surface_upper = upper[order]
+        self.reset_surface_average()
+
+    def reset_surface_average(self):
+        if self.surface_xc is not None:
+            self.surf_cp_sum.fill(0)
+            self.surf_cf_sum.fill(0)
+            self.surf_count[None] = 0
+
+    @ti.kernel
+    def inlet_density(self) -> float:
+        # Free-stream static pressure from the inlet column, since the
+        # tunnel's pressure drop lifts it above the outlet's rho = 1
+        total, cells = 0.0, 0
+        for j in range(self.height):
+            if self.cylinder[2, j] == 0:
+                total += self.f_new[2, j].sum()
+                cells += 1
+        return total / max(cells, 1)
+
+    @ti.kernel
+    def surface_kernel(self, n: int, u_ref: float, rho_ref: float, accumulate: int):
+        q_ref = 0.5 * rho_ref * u_ref * u_ref
+        for p in range(n):
+            ij = self.surf_ij[p]
+            f_vec = self.f_new[ij[0], ij[1]]
+            rho, u_vec = self.moments(f_vec)
+
+            # Viscous stress from the non-equilibrium second moment
+            pi_neq = ti.Matrix([[0.0, 0.0], [0.0, 0.0]])
+            for k in ti.static(range(9)):
+                e = ti.Vector([self.ex[k], self.ey[k]])
+                pi_neq += (f_vec[k] - self.feq(k, rho, u_vec)) * e.outer_product(e)
+            sigma = -(1.0 - 0.5 * self.omega) * pi_neq
+
+            cp = (rho - rho_ref) / 3.0 / q_ref
+            cf = self.surf_t[p].dot(sigma @ self.surf_n[p]) / q_ref
+            self.surf_cp[p] = cp
+            self.surf_cf[p] = cf
+            if accumulate:
+                self.surf_cp_sum[p] += cp
+                self.surf_cf_sum[p] += cf
+
+        if accumulate:
+            self.surf_count[None] += 1
+
+    def sample_surface(self, u_ref, accumulate=True, rho_ref=None):
+        """
+        Samples Cp and Cf at every indexed surface cell on the device.
+        Call after step(); u_ref is the free-stream lattice speed and rho_ref
+        the free-stream density (this grid's inlet column by default).
+        """
+        if self.n_surface == 0 or u_ref <= 1e-6:
+            return
+        if rho_ref is None:
+            rho_ref = self.inlet_density()
+        self.surface_kernel(self.n_surface, u_ref, rho_ref, int(accumulate))
+
+    @ti.kernel
+    def gather_surface(self, average: int, scale: float, out: ti.types.ndarray()):
+        # Only the indexed cells cross over, not the whole capacity
+        for p in range(out.shape[0]):
+            if average:
+                out[p, 0] = self.surf_cp_sum[p] * scale
+                out[p, 1] = self.surf_cf_sum[p] * scale
+            else:
+                out[p, 0] = self.surf_cp[p]
+                out[p, 1] = self.surf_cf[p]
+
+    def read_surface(self, average=True):
+        """
+        Returns {'xc', 'upper', 'cp', 'cf'} arrays for the indexed surface,
+        time-averaged since reset_surface_average when `average` is set.
+        """
+        n = self.n_surface
+        if n == 0:
+            return None
+
+        count = self.surf_count[None] if average else 0
+        buf = np.zeros((n, 2), dtype=np.float32)
+        self.gather_surface(int(count > 0), 1.0 / max(count, 1), buf)
+
+        return {'xc': self.surface_xc, 'upper': self.surface_upper,
+                'cp': buf[:, 0], 'cf': buf[:, 1]}
+
+    def add_probe(self, x, y, dx=None):
+        """
+        Registers a point probe and returns its index. Coordinates are in
+        cells, or in metres from the tunnel origin when `dx` is given.
+        """
+        if dx is not None:
+            x, y = x / dx, y / dx
+        if len(self.probe_points) >= PROBE_CAPACITY:
+            raise ValueError(f"At most {PROBE_CAPACITY} probes are supported")
+
+        if self.probe_xy is None:
+            self.probe_xy = ti.Vector.field(2, dtype=float, shape=PROBE_CAPACITY)
+            self.probe_buf = ti.Vector.field(
+                3, dtype=float, shape=(self.probe_history, PROBE_CAPACITY))
+            self.probe_steps = ti.field(dtype=int, shape=self.probe_history)
+
+        # Cell-centre coordinates for sample_bilinear
+        self.probe_xy[len(self.probe_points)] = [x - 0.5, y - 0.5]
+        self.probe_points.append((x, y))
+        return len(self.probe_points) - 1
+
+    def add_rake(self, p0, p1, n, dx=None):
+        """
+        Registers `n` evenly spaced probes from p0 to p1 (inclusive) and
+        returns their indices.
+        """
+        return [self.add_probe(p0[0] + (p1[0] - p0[0]) * s, p0[1] + (p1[1] - p0[1]) * s, dx)
+                for s in np.linspace(0.0, 1.0, n)]
+
+    def set_probe_rate(self, every):
+        self.probe_every = max(1, int(every))
+
+    def clear_probes(self):
+        self.probe_points = []
+        self.probe_written = 0
+        self.probe_drained = 0
+
+    @ti.kernel
+    def probe_kernel(self, n: int, slot: int, step: int):
+        for p in range(n):
+            xy = self.probe_xy[p]
+            f_vec = sample_bilinear(self.f_new, xy[0], xy[1], self.width, self.height)
+            rho, u_vec = self.moments(f_vec)
+            self.probe_buf[slot, p] = ti.Vector([u_vec[0], u_vec[1], rho])
+        self.probe_steps[slot] = step
+
+    @ti.kernel
+    def gather_probes(self, start: int, n: int, out: ti.types.ndarray(),
+                      steps: ti.types.ndarray()):
+        # Unwraps the ring on the device so only the drained rows cross over
+        for s, p in ti.ndrange(out.shape[0], n):
+            slot = (start + s) % self.probe_history
+            for c in ti.static(range(3)):
+                out[s, p, c] = self.probe_buf[slot, p][c]
+            if p == 0:
+                steps[s] = self.probe_steps[slot]
+
+    def drain_probes(self):
+        """
+        Returns every sample taken since the last drain as {'steps': (m,),
+        'u': (m, n, 2), 'rho': (m, n), 'dropped': int}, oldest first, in one
+        bulk transfer. Samples older than the ring length are lost and
+        counted in 'dropped'.
+        """
+        n = len(self.probe_points)
+        if n == 0:
+            return None
+
+        pending = self.probe_written - self.probe_drained
+        m = min(pending, self.probe_history)
+        self.probe_drained = self.probe_written
+
+        buf = np.zeros((m, n, 3), dtype=np.float32)
+        steps = np.zeros(m, dtype=np.int32)
+        if m > 0:
+            self.gather_probes(self.probe_written - m, n, buf, steps)
+        return {'steps': steps, 'u': buf[..., :2], 'rho': buf[..., 2],
+                'dropped': pending - m}
+
     @ti.kernel
     def render_visuals(self, mode: int):
         for i, j in self.rgb_buf:
@@ -165,8 +878,140 @@ class FluidTaichi:
 
                     self.rgb_buf[i, j] = ti.Vector([r, g, b]).cast(ti.u8)
 
+                elif ti.static(self.stats_every > 0):
+                    n = ti.max(self.stat_count[None], 1)
+                    u_mean = self.stat_u[i, j] / n
+
+                    if mode == 4:  # MEAN SPEED
+                        val = max(0, min(255, int(u_mean.norm() * 1500)))
+                        self.rgb_buf[i, j] = ti.Vector([0, val, val]).cast(ti.u8)
+
+                    elif mode == 5:  # VELOCITY RMS
+                        ms = self.stat_uu[i, j] / n
+                        var = ti.max(ms[0] - u_mean[0]**2, 0.0) + \
+                            ti.max(ms[1] - u_mean[1]**2, 0.0)
+                        val = max(0, min(255, int(ti.sqrt(var) * 6000)))
+                        self.rgb_buf[i, j] = ti.Vector(
+                            [val, int(val * 0.6), 0]).cast(ti.u8)
+
+                    elif mode == 6:  # MEAN CURL
+                        curl = self.stat_curl[i, j][0] / n
+                        val = max(0, min(255, int((curl + 0.1) * 1200)))
+                        self.rgb_buf[i, j] = ti.Vector(
+                            [val, 0, 255 - val]).cast(ti.u8)
+
+                else:  # Statistics disabled
+                    self.rgb_buf[i, j] = ti.Vector([10, 15, 30]).cast(ti.u8)
+
+    @ti.kernel
+    def mark_fluid_blocks(self):
+        # Halo: a fluid cell touching a block keeps it in play
+        B = ti.static(self.block_size)
+        for bi, bj in self.block_fluid:
+            self.block_fluid[bi, bj] = 0
+        for i, j in self.cylinder:
+            if self.cylinder[i, j] == 0:
+                for di, dj in ti.static(ti.ndrange((-1, 2), (-1, 2))):
+                    ni, nj = i + di, j + dj
+                    if 0 <= ni < self.width and 0 <= nj < self.height:
+                        self.block_fluid[ni // B, nj // B] = 1
+
+    @ti.kernel
+    def mark_blocks(self, u_free: float, tol: float):
+        # Deviation from free-stream equilibrium, stopping once past tol
+        B = ti.static(self.block_size)
+        feq = ti.Vector([0.0] * 9)
+        for k in ti.static(range(9)):
+            feq[k] = self.feq(k, 1.0, ti.Vector([u_free, 0.0]))
+        for bi, bj in self.block_dev:
+            dev = 0.0
+            for c in range(B * B):
+                i, j = bi * B + c // B, bj * B + c % B
+                if i < self.width and j < self.height and self.cylinder[i, j] == 0:
+                    dev = max(dev, ti.abs(self.f[i, j] - feq).max())
+                    if dev > tol:
+                        break
+            self.block_dev[bi, bj] = dev
+
+    @ti.kernel
+    def update_blocks(self, u_free: float, tol: float, allow_idle: int):
+        B = ti.static(self.block_size)
+        self.n_blocks[None] = 0
+        for bi, bj in self.block_on:
+            on = self.block_fluid[bi, bj]
+            if on == 1 and allow_idle:
+                # Idle only if this block and its neighbours are quiet, so a
+                # disturbance can't cross into it before the next refresh
+                quiet = 1
+                for di, dj in ti.static(ti.ndrange((-1, 2), (-1, 2))):
+                    ni, nj = bi + di, bj + dj
+                    if 0 <= ni < self.nbx and 0 <= nj < self.nby:
+                        if self.block_dev[ni, nj] > tol:
+                            quiet = 0
+                on = 1 - quiet
+
+            if on == 1:
+                self.n_blocks[None] += 1
+            elif self.block_on[bi, bj] == 1 and self.block_fluid[bi, bj] == 1:
+                self.relax_block(bi, bj, u_free)
+            self.block_on[bi, bj] = on
+
+    @ti.func
+    def relax_block(self, bi, bj, u_free):
+        B = ti.static(self.block_size)
+        u_vec = ti.Vector([u_free, 0.0])
+        for a, b in ti.ndrange(B, B):
+            i, j = bi * B + a, bj * B + b
+            if i < self.width and j < self.height and self.cylinder[i, j] == 0:
+                for k in ti.static(range(9)):
+                    self.f[i, j][k] = self.feq(k, 1.0, u_vec)
+                    self.f_new[i, j][k] = self.feq(k, 1.0, u_vec)
+                if ti.static(not self.lazy_macros):
+                    self.rho[i, j] = 1.0
+                    self.u[i, j] = u_vec
+
+    def refresh_activity(self, allow_idle):
+        # Without allow_idle only the solid blocks are skipped
+        u_free = self.u_in[None]
+        tol = self.sparse_tol * max(u_free, 0.01)
+        if self.activity_stale:
+            self.mark_fluid_blocks()
+        if allow_idle:
+            self.mark_blocks(u_free, tol)
+        self.update_blocks(u_free, tol, int(allow_idle))
+        self.sparse_idle = allow_idle
+
+    def active_fraction(self):
+        if not self.sparse:
+            return 1.0
+        return self.n_blocks[None] / (self.nbx * self.nby)
+
     def step(self):
-        self.step_kernel()
+        if self.sparse:
+            # Idle blocks are only allowed while the inlet holds steady
+            u_in = self.u_in[None]
+            steady = u_in == self.sparse_u_in
+            if self.activity_stale or (self.sparse_idle and not steady):
+                self.refresh_activity(allow_idle=False)
+                self.activity_stale = False
+            elif steady and self.step_count % self.block_size == 0:
+                self.refresh_activity(allow_idle=True)
+            self.sparse_u_in = u_in
+        self.step_count += 1
+
+        stats = self.stats_every > 0 and self.step_count % self.stats_every == 0
+
+        self.stream_interior()
+        self.stream_boundary()
+        self.collide_kernel(int(stats))
+        if stats and self.sparse:
+            self.stats_kernel()
+        self.macros_stale = self.lazy_macros
+
+        if self.probe_points and self.step_count % self.probe_every == 0:
+            self.probe_kernel(len(self.probe_points),
+                              self.probe_written % self.probe_history, self.step_count)
+            self.probe_written += 1
         return self.drag_val[None], self.lift_val[None], np.sqrt(self.max_v_sq[None])
 
     def export_visuals(self, out_arr):
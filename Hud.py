@@ -1,6 +1,9 @@
 import pygame
 import numpy as np
 
+# Space left of / below the polar for expanded-mode axis labels
+GRAPH_MARGIN_L, GRAPH_MARGIN_B = 90, 60
+
 
 class HUD:
     def __init__(self, display_w, display_h, width, height, cell_size):
@@ -34,7 +37,46 @@ class HUD:
         self.overlay_surf = pygame.Surface((display_w, display_h))
         self.overlay_surf.fill((0, 0, 0))
 
+        # Render Caches
+        self.text_cache = {}
+        self.panel_cache = {}
+        self.graph_cache = None
+        self.graph_key = None
+        self.controls_surf = None
+        self.safety_key = None
+        self.safety_rects = []
+        self.dirty = []
+
+    def _text(self, font, text, color):
+        # Glyph surfaces are reused until the text actually changes
+        key = (id(font), text, color)
+        surf = self.text_cache.get(key)
+        if surf is None:
+            if len(self.text_cache) > 512:
+                self.text_cache.clear()
+            surf = font.render(text, True, color)
+            self.text_cache[key] = surf
+        return surf
+
+    def _panel(self, w, h, color, alpha):
+        key = (w, h, color, alpha)
+        surf = self.panel_cache.get(key)
+        if surf is None:
+            surf = pygame.Surface((w, h))
+            surf.set_alpha(alpha)
+            surf.fill(color)
+            self.panel_cache[key] = surf
+        return surf
+
+    def _blit(self, screen, surf, pos):
+        self.dirty.append(screen.blit(surf, pos))
+
     def render(self, screen, fluid, stats):
+        """
+        Draws the HUD and returns the screen rects it touched, for
+        pygame.display.update when the background has not changed.
+        """
+        self.dirty = []
         if stats['show_hud']:
             self._draw_dashboard(screen, fluid, stats)
             self._draw_status(screen, stats)
@@ -49,7 +91,7 @@ class HUD:
         if expansion > 0.01:
             alpha = int(expansion * 160)
             self.overlay_surf.set_alpha(alpha)
-            screen.blit(self.overlay_surf, (0, 0))
+            self._blit(screen, self.overlay_surf, (0, 0))
 
         if stats['sweep_data']:
             self._draw_graph(
@@ -58,6 +100,8 @@ class HUD:
         if stats['input_active']:
             self._draw_menu(screen, stats['user_text'])
 
+        return self.dirty
+
     def _draw_sweep_status(self, screen, stats):
         cx = self.dw // 2
         cy = 40
@@ -66,18 +110,15 @@ class HUD:
         txt_2 = f"Full Sweep: {stats['swp_rem_total']:.0f}s remaining"
         txt_3 = "Press 'X' to Cancel"
 
-        s1 = self.btn_font.render(txt_1, True, self.c_red)
-        s2 = self.btn_font.render(txt_2, True, self.c_orange)
-        s3 = self.btn_font.render(txt_3, True, (200, 200, 200))
+        s1 = self._text(self.btn_font, txt_1, self.c_red)
+        s2 = self._text(self.btn_font, txt_2, self.c_orange)
+        s3 = self._text(self.btn_font, txt_3, (200, 200, 200))
 
         w = max(s1.get_width(), s2.get_width()) + 40
         h = 85
         bg_rect = pygame.Rect(cx - w//2, cy - 10, w, h)
 
-        s = pygame.Surface((w, h))
-        s.set_alpha(220)
-        s.fill((10, 10, 20))
-        screen.blit(s, bg_rect)
+        self._blit(screen, self._panel(w, h, (10, 10, 20), 220), bg_rect)
         pygame.draw.rect(screen, self.c_red, bg_rect, 2)
 
         screen.blit(s1, (cx - s1.get_width()//2, cy))
@@ -102,18 +143,27 @@ class HUD:
         self._draw_dashed_line(screen, self.c_safe_line, (xl, yt), (xr, yt))
         self._draw_dashed_line(screen, self.c_safe_line, (xl, yb), (xr, yb))
 
+        if self.safety_key != (mx, my):
+            self.safety_key = (mx, my)
+            self.safety_rects = [
+                pygame.Rect(xl - 2, yt - 2, 4, yb - yt + 12),
+                pygame.Rect(xr - 2, yt - 2, 4, yb - yt + 12),
+                pygame.Rect(xl - 2, yt - 2, xr - xl + 12, 4),
+                pygame.Rect(xl - 2, yb - 2, xr - xl + 12, 4)]
+        self.dirty.extend(self.safety_rects)
+
     def _draw_dashboard(self, screen, fluid, stats):
         dur = (pygame.time.get_ticks() - stats['start_tick']) / 1000.0
         header = f"AIRFOIL: {stats['name']} | TIME: {dur:.1f}s"
-        screen.blit(self.font.render(header, True, (255, 255, 255)), (10, 10))
+        self._blit(screen, self._text(self.font, header, (255, 255, 255)), (10, 10))
 
         peak = stats.get('peak_speed', 0.0)
 
         s_pct = max(0, min(100, (1.0 - peak/stats['max_speed'])*100))
         c = self.c_green if s_pct > 70 else self.c_yellow if s_pct > 40 else self.c_red
 
-        screen.blit(self.font.render(
-            f"SIM STABILITY: {s_pct:.1f}%", True, c), (10, 35))
+        self._blit(screen, self._text(
+            self.font, f"SIM STABILITY: {s_pct:.1f}%", c), (10, 35))
         pygame.draw.rect(screen, (50, 50, 50), (10, 55, 150, 6))
         pygame.draw.rect(screen, c, (10, 55, int(s_pct * 1.5), 6))
 
@@ -121,46 +171,50 @@ class HUD:
                     stats['start_tick']) / stats['conv_time'] * 100)
         c = self.c_green if d_pct >= 100 else self.c_yellow if d_pct > 50 else self.c_orange
 
-        screen.blit(self.font.render(
-            f"DATA STABILITY: {d_pct:.1f}%", True, c), (10, 70))
+        self._blit(screen, self._text(
+            self.font, f"DATA STABILITY: {d_pct:.1f}%", c), (10, 70))
         pygame.draw.rect(screen, (50, 50, 50), (10, 90, 150, 6))
         pygame.draw.rect(screen, c, (10, 90, int(d_pct * 1.5), 6))
+        self.dirty.append(pygame.Rect(10, 55, 150, 41))
 
         y_off = 110
         rd, rl, rw = stats['drag'], stats['lift'], stats['wind']
-        screen.blit(self.font.render(
-            f"DRAG: {rd:.2f} N", True, (255, 100, 100)), (10, y_off))
-        screen.blit(self.font.render(
-            f"LIFT: {rl:.2f} N", True, (100, 255, 100)), (10, y_off + 20))
-        screen.blit(self.font.render(
-            f"WIND: {rw:.1f} m/s", True, (100, 200, 255)), (10, y_off + 40))
+        self._blit(screen, self._text(
+            self.font, f"DRAG: {rd:.2f} N", (255, 100, 100)), (10, y_off))
+        self._blit(screen, self._text(
+            self.font, f"LIFT: {rl:.2f} N", (100, 255, 100)), (10, y_off + 20))
+        self._blit(screen, self._text(
+            self.font, f"WIND: {rw:.1f} m/s", (100, 200, 255)), (10, y_off + 40))
 
     def _draw_status(self, screen, stats):
         scale_txt = f"Time Scale: {stats['time_scale']}"
-        screen.blit(self.font.render(scale_txt, True,
-                    (150, 255, 255)), (10, self.dh - 45))
+        self._blit(screen, self._text(self.font, scale_txt,
+                   (150, 255, 255)), (10, self.dh - 45))
 
         status_state = "PAUSED" if stats['paused'] else "RUNNING"
         final_str = f"FPS: {stats['fps']} | AVG FPS: {stats['avg_fps']} | {status_state} | Mode: {stats['mode_str']}"
+        if stats.get('recording'):
+            final_str += " | REC"
 
-        screen.blit(self.font.render(final_str, True,
-                    self.c_yellow), (10, self.dh - 25))
+        self._blit(screen, self._text(self.font, final_str,
+                   self.c_yellow), (10, self.dh - 25))
 
     def _draw_controls(self, screen):
         lines = ["CONTROLS", "SPACE: Pause", "R: Reset Airflow", "C: Clear Obstacles",
-                 "A: Airfoil Menu", "D: Sweep Data", "1-4: View Modes", "H: HUD"]
+                 "A: Airfoil Menu", "D: Sweep Data", "G: Pitch Ramp", "F: Record Fields", "P: Save Surface Cp", "1-8: View Modes", "H: HUD"]
         w, h = 200, len(lines)*20 + 10
         x, y = self.dw - w - 10, 10
 
-        s = pygame.Surface((w, h))
-        s.set_alpha(180)
-        s.fill(self.c_bg)
-        screen.blit(s, (x, y))
-        pygame.draw.rect(screen, (100, 100, 100), (x, y, w, h), 1)
+        # Static panel: rasterized once, then a single blit per frame
+        if self.controls_surf is None:
+            self.controls_surf = pygame.Surface((w, h), pygame.SRCALPHA)
+            self.controls_surf.fill((*self.c_bg, 180))
+            pygame.draw.rect(self.controls_surf, (100, 100, 100), (0, 0, w, h), 1)
+            for i, t in enumerate(lines):
+                c = self.c_yellow if i == 0 else self.c_text
+                self.controls_surf.blit(self.font.render(t, True, c), (10, 5+i*20))
 
-        for i, t in enumerate(lines):
-            c = self.c_yellow if i == 0 else self.c_text
-            screen.blit(self.font.render(t, True, c), (x+10, y+5+i*20))
+        self._blit(screen, self.controls_surf, (x, y))
 
     def get_graph_rect(self, expansion):
         # Small: Bottom Right
@@ -183,13 +237,26 @@ class HUD:
 
     def _draw_graph(self, screen, data, expansion, sweep_active):
         rect = self.get_graph_rect(expansion)
-        gx, gy, gw, gh = rect.x, rect.y, rect.width, rect.height
 
-        s = pygame.Surface((gw, gh))
-        s.set_alpha(200 if expansion < 0.5 else 230)
-        s.fill(self.c_bg)
-        screen.blit(s, (gx, gy))
-        pygame.draw.rect(screen, (100, 100, 100), rect, 1)
+        # The polar only changes when a point lands, the rect animates, or
+        # the detail level flips; otherwise reuse the last raster.
+        key = (tuple(data), rect.size, expansion > 0.5, expansion > 0.8, sweep_active)
+        if key != self.graph_key:
+            self.graph_key = key
+            self.graph_cache = self._render_graph(
+                data, rect.width, rect.height, expansion, sweep_active)
+
+        self._blit(screen, self.graph_cache, (rect.x - GRAPH_MARGIN_L, rect.y))
+
+    def _render_graph(self, data, gw, gh, expansion, sweep_active):
+        # Margins hold the axis labels drawn outside the plot in expanded mode
+        surf = pygame.Surface(
+            (gw + GRAPH_MARGIN_L, gh + GRAPH_MARGIN_B), pygame.SRCALPHA)
+        gx, gy = GRAPH_MARGIN_L, 0
+        rect = pygame.Rect(gx, gy, gw, gh)
+
+        surf.fill((*self.c_bg, 200 if expansion < 0.5 else 230), rect)
+        pygame.draw.rect(surf, (100, 100, 100), rect, 1)
 
         vals = [d[1] for d in data] + [d[2] for d in data]
         if not vals:
@@ -209,22 +276,22 @@ class HUD:
         # Zero Line
         zy = gy + gh - int((0-min_y)/dy*gh)
         if gy <= zy <= gy+gh:
-            pygame.draw.line(screen, (80, 80, 80), (gx, zy), (gx+gw, zy))
+            pygame.draw.line(surf, (80, 80, 80), (gx, zy), (gx+gw, zy))
 
         # Plot Lines
         for i in range(len(data)):
             a, l, d = data[i]
             pl, pd = pts(a, l), pts(a, d)
 
-            pygame.draw.circle(screen, self.c_green, pl,
+            pygame.draw.circle(surf, self.c_green, pl,
                                3 if expansion > 0.5 else 2)
-            pygame.draw.circle(screen, self.c_red, pd,
+            pygame.draw.circle(surf, self.c_red, pd,
                                3 if expansion > 0.5 else 2)
 
             if i > 0:
                 pa, pl0, pd0 = data[i-1]
-                pygame.draw.line(screen, self.c_green, pts(pa, pl0), pl, 2)
-                pygame.draw.line(screen, self.c_red, pts(pa, pd0), pd, 2)
+                pygame.draw.line(surf, self.c_green, pts(pa, pl0), pl, 2)
+                pygame.draw.line(surf, self.c_red, pts(pa, pd0), pd, 2)
 
         # Expanded Content
         if expansion > 0.8:
@@ -234,11 +301,11 @@ class HUD:
                 val = min_y + (dy * t)
                 py = gy + gh - int((t) * gh)
 
-                pygame.draw.line(screen, (150, 150, 150),
+                pygame.draw.line(surf, (150, 150, 150),
                                  (gx, py), (gx - 8, py))
                 lbl = self.font.render(f"{val:.1f}", True, (180, 180, 180))
-                screen.blit(lbl, (gx - lbl.get_width() -
-                            12, py - lbl.get_height()//2))
+                surf.blit(lbl, (gx - lbl.get_width() -
+                          12, py - lbl.get_height()//2))
 
             start_tick = int(np.ceil(min_a / 5.0)) * 5
             end_tick = int(np.floor(max_a / 5.0)) * 5
@@ -246,18 +313,18 @@ class HUD:
             curr_tick = start_tick
             while curr_tick <= end_tick:
                 px = gx + int(((curr_tick - min_a) / da) * gw)
-                pygame.draw.line(screen, (150, 150, 150),
+                pygame.draw.line(surf, (150, 150, 150),
                                  (px, gy + gh), (px, gy + gh + 8))
                 lbl = self.font.render(f"{curr_tick}°", True, (180, 180, 180))
-                screen.blit(lbl, (px - lbl.get_width()//2, gy + gh + 10))
+                surf.blit(lbl, (px - lbl.get_width()//2, gy + gh + 10))
                 curr_tick += 5
 
             lbl_y = self.font.render("Force (N)", True, (200, 200, 200))
             lbl_y = pygame.transform.rotate(lbl_y, 90)
-            screen.blit(lbl_y, (gx - 60, gy + gh//2 - lbl_y.get_height()//2))
+            surf.blit(lbl_y, (gx - 60, gy + gh//2 - lbl_y.get_height()//2))
 
-            screen.blit(self.font.render("Angle of Attack (°)", True, (200, 200, 200)),
-                        (gx + gw//2 - 60, gy + gh + 35))
+            surf.blit(self.font.render("Angle of Attack (°)", True, (200, 200, 200)),
+                      (gx + gw//2 - 60, gy + gh + 35))
 
             # Stats Box
             max_l = max(data, key=lambda x: x[1])
@@ -273,30 +340,30 @@ class HUD:
                 f"Best L/D Ratio: {(best_ld[1]/best_ld[2]):.2f} @ {best_ld[0]}°"
             ]
 
-            screen.blit(self.btn_font.render(
+            surf.blit(self.btn_font.render(
                 "LIFT (Green) vs DRAG (Red) POLAR", True, (255, 255, 255)), (gx+20, gy+20))
 
             sy = gy + 60
             for line in stats_txt:
-                screen.blit(self.font.render(
+                surf.blit(self.font.render(
                     line, True, (200, 200, 200)), (gx+30, sy))
                 sy += 25
 
         # Small Mode Content
         elif not sweep_active and len(data) > 0:
             txt = self.btn_font.render("CLICK TO VIEW", True, self.c_yellow)
-            screen.blit(txt, (gx + gw//2 - txt.get_width()//2, gy + 10))
+            surf.blit(txt, (gx + gw//2 - txt.get_width()//2, gy + 10))
+
+        return surf
 
     def _draw_menu(self, screen, user_text):
-        s = pygame.Surface((self.box_rect.width, self.box_rect.height))
-        s.set_alpha(240)
-        s.fill((30, 30, 30))
-        screen.blit(s, self.box_rect)
+        self._blit(screen, self._panel(self.box_rect.width, self.box_rect.height,
+                                       (30, 30, 30), 240), self.box_rect)
         pygame.draw.rect(screen, (200, 200, 200), self.box_rect, 2)
 
-        screen.blit(self.font.render("NACA Code:", True, self.c_text),
+        screen.blit(self._text(self.font, "NACA Code:", self.c_text),
                     (self.box_rect.x+20, self.box_rect.y+20))
-        screen.blit(self.font.render(user_text + "_", True,
+        screen.blit(self._text(self.font, user_text + "_",
                     self.c_yellow), (self.box_rect.x+20, self.box_rect.y+50))
 
         mx, my = pygame.mouse.get_pos()
@@ -307,10 +374,10 @@ class HUD:
 
         pygame.draw.rect(screen, c1, self.btn_gen)
         pygame.draw.rect(screen, (200, 200, 200), self.btn_gen, 1)
-        screen.blit(self.btn_font.render("GENERATE", True,
+        screen.blit(self._text(self.btn_font, "GENERATE",
                     (255, 255, 255)), (self.btn_gen.x+45, self.btn_gen.y+10))
 
         pygame.draw.rect(screen, c2, self.btn_swp)
         pygame.draw.rect(screen, (200, 200, 200), self.btn_swp, 1)
-        screen.blit(self.btn_font.render("SWEEP", True, self.c_green),
+        screen.blit(self._text(self.btn_font, "SWEEP", self.c_green),
                     (self.btn_swp.x+60, self.btn_swp.y+10))
@@ -1,9 +1,17 @@
+import csv
+import os
+import time
 import pygame
 import numpy as np
 import taichi as ti
 from FluidTaichi import FluidTaichi
+from RefinedFluidTaichi import RefinedFluidTaichi, default_patch
 from ParticlesTaichi import ParticlesTaichi
-from AirfoilGenerator import stamp_airfoil
+from ScalarTaichi import ScalarTaichi
+from AirfoilGenerator import stamp_airfoil, airfoil_outline
+from FieldRecorder import FieldRecorder
+from ResultCache import ResultCache
+import SweepRunner
 from Hud import HUD
 
 # Initialize GPU
@@ -25,6 +33,16 @@ REAL_AIR_SPEED = 30.0
 AIR_DENSITY = 1.225
 LATTICE_SPEED = 0.1
 MAX_LATTICE_SPEED = 0.577
+VISCOSITY = 0.015
+OUTLET = "zero_gradient"
+WALLS = "slip"
+SPARSE = False
+REFINE_RATIO = 1
+WARM_START_RATIO = 1
+WARM_START_STEPS = 8000
+WARM_SETTLE_STEPS = 2000
+LAZY_MACROS = True
+STATS_EVERY = 10
 
 # Derived Math
 dx = TUNNEL_HEIGHT_M / HEIGHT
@@ -32,19 +50,53 @@ dt = (LATTICE_SPEED * dx) / REAL_AIR_SPEED
 FORCE_SCALE = AIR_DENSITY * (dx**3) / (dt**2)
 MARGIN_X, MARGIN_Y = WIDTH // 5, HEIGHT // 3
 
+# Smoke
+SMOKE_SPACING = 9
+SMOKE_DIFFUSIVITY = 0.0
+SMOKE_THICKNESS = 2
+
 # Data Sweep
 SWEEP_TIME_FIRST = 150 * TARGET_FPS * STEPS_PER_FRAME
 SWEEP_ANGLES = list(range(-5, 16, 1))
 CONVERGENCE_TIME_MS = 180000
+CACHE_PATH = "results_cache.sqlite"
+
+# Pitching Ramp
+RAMP_RATE = SweepRunner.RAMP_RATE
+RAMP_EVERY = SweepRunner.RAMP_EVERY
+RAMP_REVERSE = True
+
+# Field Recording
+RECORD_FIELDS = ('u', 'rho', 'curl')
+RECORD_EVERY = 50
+RECORD_DECIMATE = 1
+RECORD_DIR = "recordings"
+
+# Surface Distributions
+SURFACE_DIR = "surface"
 
 # Setup
 pygame.init()
 screen = pygame.display.set_mode((DISPLAY_W, DISPLAY_H))
 clock = pygame.time.Clock()
 
-fluid = FluidTaichi(WIDTH, HEIGHT, viscosity=0.015)
+if REFINE_RATIO > 1:
+    fluid = RefinedFluidTaichi(WIDTH, HEIGHT, default_patch(WIDTH, HEIGHT, WIDTH//3),
+                               ratio=REFINE_RATIO, viscosity=VISCOSITY,
+                               outlet=OUTLET, walls=WALLS, sparse=SPARSE,
+                               lazy_macros=LAZY_MACROS, stats_every=STATS_EVERY)
+else:
+    fluid = FluidTaichi(WIDTH, HEIGHT, viscosity=VISCOSITY,
+                        outlet=OUTLET, walls=WALLS, sparse=SPARSE, lazy_macros=LAZY_MACROS,
+                        stats_every=STATS_EVERY)
 particles = ParticlesTaichi(200000, WIDTH, HEIGHT, CELL_SIZE)
+smoke = ScalarTaichi(WIDTH, HEIGHT, diffusivity=SMOKE_DIFFUSIVITY)
+smoke.add_rake(3, 2, HEIGHT - 2, spacing=SMOKE_SPACING, thickness=SMOKE_THICKNESS)
 hud = HUD(DISPLAY_W, DISPLAY_H, WIDTH, HEIGHT, CELL_SIZE)
+cache = ResultCache(CACHE_PATH)
+stale = cache.purge_stale()
+if stale:
+    print(f"Dropped {stale} cached points from older solver versions")
 
 fluid.init_flow()
 
@@ -53,6 +105,7 @@ fluid_arr = np.zeros((WIDTH, HEIGHT, 3), dtype=np.uint8)
 fluid_surf = pygame.Surface((WIDTH, HEIGHT))
 part_arr = np.zeros((DISPLAY_W, DISPLAY_H, 3), dtype=np.uint8)
 part_surf = pygame.Surface((DISPLAY_W, DISPLAY_H))
+scaled_surf = pygame.Surface((DISPLAY_W, DISPLAY_H))
 
 # State
 view_mode = 2
@@ -65,6 +118,11 @@ sim_start_tick = pygame.time.get_ticks()
 current_airfoil_name = "None"
 sweep_buffer = []
 
+# Display State
+last_view_mode = -1
+hud_rects = []
+bg_surf = part_surf
+
 # Graph Animation State
 graph_expansion = 0.0
 graph_target_state = 0.0
@@ -84,18 +142,97 @@ spool_rate = 0.001
 sweep_active = False
 sweep_index = 0
 sweep_timer = 0
+sweep_settle, sweep_target = 0, 0
 sweep_data = []
 sweep_buffer = []
+sweep_pending = []
+ramp = None
+
+# Recording State
+recorder = None
 
 
 def reset_simulation(hard=False):
-    global current_lb_speed, smooth_drag, smooth_lift, sim_start_tick
-    fluid.init_flow()
+    global current_lb_speed, smooth_drag, smooth_lift, sim_start_tick, last_view_mode
     if hard:
-        fluid.cylinder.fill(0)
+        fluid.reset()
+        smoke.reset()
+    else:
+        fluid.init_flow()
     current_lb_speed = 0.0
     smooth_drag, smooth_lift = 0.0, 0.0
     sim_start_tick = pygame.time.get_ticks()
+    last_view_mode = -1
+
+
+def run_config(code, angle):
+    return SweepRunner.make_config(
+        naca=code, angle=angle, width=WIDTH, height=HEIGHT, viscosity=VISCOSITY,
+        outlet=OUTLET, walls=WALLS, sparse=SPARSE, refine_ratio=REFINE_RATIO,
+        warm_start_ratio=WARM_START_RATIO,
+        warm_start_steps=WARM_START_STEPS if WARM_START_RATIO > 1 else 0,
+        warm_settle_steps=WARM_SETTLE_STEPS if WARM_START_RATIO > 1 else 0,
+        lattice_speed=LATTICE_SPEED, real_air_speed=REAL_AIR_SPEED,
+        tunnel_height_m=TUNNEL_HEIGHT_M, air_density=AIR_DENSITY,
+        spool_rate=spool_rate, smoothing_alpha=SMOOTHING_ALPHA,
+        steps_per_frame=STEPS_PER_FRAME, sweep_steps=SWEEP_TIME_FIRST)
+
+
+def cached_point(code, angle):
+    # Cached under the lattice case, shared with headless runs at any speed
+    config = run_config(code, angle)
+    base = SweepRunner.lattice_config(config)
+    hit = cache.get(base)
+    if hit is None:
+        return None
+    return SweepRunner.rescale_forces(config, base, *hit)
+
+
+def cache_point(code, angle, lift, drag):
+    config = run_config(code, angle)
+    base = SweepRunner.lattice_config(config)
+    cache.put(base, *SweepRunner.rescale_forces(base, config, lift, drag))
+
+
+def place_airfoil(code, angle):
+    global last_view_mode
+    last_view_mode = -1
+    temp_cyl = np.zeros((WIDTH, HEIGHT), dtype=bool)
+    poly = stamp_airfoil(temp_cyl, code, WIDTH//2, HEIGHT//2, WIDTH//3, angle)
+    if REFINE_RATIO > 1:
+        shape, fcx, fcy, fchord = fluid.fine_frame(WIDTH//2, HEIGHT//2, WIDTH//3)
+        fine_cyl = np.zeros(shape, dtype=bool)
+        poly = stamp_airfoil(fine_cyl, code, fcx, fcy, fchord, angle)
+        fluid.set_obstacle(temp_cyl, fine_cyl)
+    else:
+        fluid.set_obstacle(temp_cyl)
+    fluid.build_surface_index(poly)
+    fluid.reset_statistics()
+
+
+def save_surface(path):
+    data = fluid.read_surface()
+    if data is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['xc', 'side', 'cp', 'cf'])
+        for xc, up, cp, cf in zip(data['xc'], data['upper'], data['cp'], data['cf']):
+            writer.writerow([f"{xc:.5f}", "upper" if up else "lower", f"{cp:.5f}", f"{cf:.6f}"])
+    print(f"Saved surface distribution to {path}")
+
+
+def start_sweep_point(angle):
+    global current_lb_speed, sweep_settle, sweep_target
+    sweep_settle, sweep_target = SweepRunner.sweep_schedule(run_config(current_naca, angle))
+    reset_simulation(hard=False)
+    place_airfoil(current_naca, angle)
+    if WARM_START_RATIO > 1:
+        # Blocks briefly while the coarse grid develops the flow
+        fluid.prolongate_from(SweepRunner.warm_start(
+            run_config(current_naca, angle)))
+        current_lb_speed = LATTICE_SPEED
 
 
 def action_generate(text):
@@ -107,9 +244,7 @@ def action_generate(text):
         current_naca = code
         current_airfoil_name = f"NACA {code}"
 
-        temp_cyl = np.zeros((WIDTH, HEIGHT), dtype=bool)
-        stamp_airfoil(temp_cyl, code, WIDTH//2, HEIGHT//2, WIDTH//3, angle)
-        fluid.cylinder.from_numpy(temp_cyl.astype(int))
+        place_airfoil(code, angle)
 
         sim_start_tick = pygame.time.get_ticks()
         print(f"Generated {code} at {angle}°")
@@ -120,25 +255,57 @@ def action_generate(text):
 
 
 def action_sweep(text):
-    global input_active, user_text, current_naca, sweep_active, sweep_index, sweep_timer, sweep_data, sweep_buffer, current_airfoil_name
+    global input_active, user_text, current_naca, sweep_active, sweep_index, sweep_timer, sweep_data, sweep_buffer, sweep_pending, current_airfoil_name, ramp
     try:
         code = text.split()[0]
+        ramp = None
         current_naca = code
         current_airfoil_name = f"Sweep {code}"
-        reset_simulation(hard=False)
-        sweep_active, sweep_index, sweep_timer = True, 0, 0
-        sweep_data, sweep_buffer = [], []
-
-        temp_cyl = np.zeros((WIDTH, HEIGHT), dtype=bool)
-        stamp_airfoil(temp_cyl, current_naca, WIDTH//2,
-                      HEIGHT//2, WIDTH//3, SWEEP_ANGLES[0])
-        fluid.cylinder.from_numpy(temp_cyl.astype(int))
+        sweep_index, sweep_timer = 0, 0
+        sweep_data, sweep_buffer, sweep_pending = [], [], []
+
+        # Reuse Cached Points
+        for angle in SWEEP_ANGLES:
+            hit = cached_point(code, angle)
+            if hit is None:
+                sweep_pending.append(angle)
+            else:
+                sweep_data.append((angle, hit[0], hit[1]))
+
+        print(
+            f"Sweep {code}: {len(sweep_data)} cached, {len(sweep_pending)} to simulate")
+        sweep_active = len(sweep_pending) > 0
+
+        if sweep_active:
+            start_sweep_point(sweep_pending[0])
     except:
         pass
     input_active = False
     user_text = ""
 
 
+def action_ramp(code):
+    global current_airfoil_name, sweep_active, sweep_data, ramp
+    sweep_active = False
+    sweep_data = []
+    current_airfoil_name = f"Ramp {code}"
+
+    # One run: settle at the first angle, then pitch through the range
+    ramp = SweepRunner.PitchRamp(SWEEP_ANGLES, RAMP_RATE, RAMP_EVERY,
+                                 settle=SWEEP_TIME_FIRST // 2, reverse=RAMP_REVERSE)
+    reset_simulation(hard=False)
+    place_airfoil(code, ramp.start)
+    fluid.set_body(airfoil_outline(code, WIDTH//3), WIDTH//2, HEIGHT//2)
+    print(f"Ramp {code}: {ramp.total_steps} steps")
+
+
+def end_ramp():
+    global ramp
+    # Restamp on the host so the surface index matches the final mask
+    place_airfoil(current_naca, ramp.body_angle)
+    ramp = None
+
+
 running = True
 while running:
     # Event Loop
@@ -176,6 +343,16 @@ while running:
                     view_mode = 2
                 if event.key == pygame.K_4:
                     view_mode = 3
+                # Time-averaged views need the on-GPU statistics
+                if STATS_EVERY > 0:
+                    if event.key == pygame.K_5:
+                        view_mode = 4
+                    if event.key == pygame.K_6:
+                        view_mode = 5
+                    if event.key == pygame.K_7:
+                        view_mode = 6
+                if event.key == pygame.K_8:
+                    view_mode = 7
 
                 if event.key == pygame.K_h:
                     show_hud = not show_hud
@@ -191,9 +368,26 @@ while running:
                     reset_simulation(hard=False)
                 if event.key == pygame.K_d:
                     action_sweep(current_naca)
+                if event.key == pygame.K_g:
+                    action_ramp(current_naca)
                 if event.key == pygame.K_x:
                     if sweep_active:
                         sweep_active = False
+                    if ramp is not None:
+                        end_ramp()
+                if event.key == pygame.K_f:
+                    if recorder is None:
+                        stamp = time.strftime("%Y%m%d_%H%M%S")
+                        recorder = FieldRecorder(
+                            fluid, os.path.join(RECORD_DIR, stamp), fields=RECORD_FIELDS,
+                            every=RECORD_EVERY, decimate=RECORD_DECIMATE)
+                        print(f"Recording fields to {recorder.path}")
+                    else:
+                        recorder.close()
+                        recorder = None
+                if event.key == pygame.K_p:
+                    stamp = time.strftime("%Y%m%d_%H%M%S")
+                    save_surface(os.path.join(SURFACE_DIR, f"{current_naca}_{stamp}.csv"))
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 mx, my = pygame.mouse.get_pos()
@@ -211,44 +405,63 @@ while running:
             fluid.set_inlet(current_lb_speed)
             d, l, spd = fluid.step()
             current_peak_speed = spd
+            if recorder is not None:
+                recorder.step()
 
             smooth_drag = (d * SMOOTHING_ALPHA) + \
                 (smooth_drag * (1-SMOOTHING_ALPHA))
             smooth_lift = (l * SMOOTHING_ALPHA) + \
                 (smooth_lift * (1-SMOOTHING_ALPHA))
 
+            if ramp is not None:
+                angle = ramp.advance(-l*FORCE_SCALE, d*FORCE_SCALE)
+                if angle is not None:
+                    fluid.rotate_body(angle)
+
+        if ramp is None:
+            fluid.sample_surface(current_lb_speed)
+        elif ramp.done:
+            sweep_data = ramp.polar("mean" if RAMP_REVERSE else "up")
+            for angle, dl, dd in ramp.hysteresis():
+                print(f"Hysteresis {angle}°: dL={dl:.2f} dD={dd:.2f}")
+            print("--- Ramp Complete ---")
+            end_ramp()
+        else:
+            sweep_data = ramp.polar(ramp.direction())
+
         if sweep_active:
             sweep_timer += STEPS_PER_FRAME
-            target = SWEEP_TIME_FIRST
 
-            if sweep_timer > target // 2:
+            if sweep_timer > sweep_settle:
+                if not sweep_buffer:
+                    fluid.reset_surface_average()
+                    fluid.reset_statistics()
                 sweep_buffer.append(
                     (-smooth_lift*FORCE_SCALE, smooth_drag*FORCE_SCALE))
 
-            if sweep_timer > target:
+            if sweep_timer > sweep_target:
                 if sweep_buffer:
                     avg_l = sum(d[0] for d in sweep_buffer)/len(sweep_buffer)
                     avg_d = sum(d[1] for d in sweep_buffer)/len(sweep_buffer)
                 else:
                     avg_l, avg_d = -smooth_lift*FORCE_SCALE, smooth_drag*FORCE_SCALE
 
-                sweep_data.append((SWEEP_ANGLES[sweep_index], avg_l, avg_d))
-                print(
-                    f"Recorded {SWEEP_ANGLES[sweep_index]}°: L={avg_l:.2f} D={avg_d:.2f}")
+                angle = sweep_pending[sweep_index]
+                sweep_data.append((angle, avg_l, avg_d))
+                sweep_data.sort(key=lambda x: x[0])
+                cache_point(current_naca, angle, avg_l, avg_d)
+                print(f"Recorded {angle}°: L={avg_l:.2f} D={avg_d:.2f}")
+                save_surface(os.path.join(SURFACE_DIR, f"{current_naca}_{angle:+.1f}.csv"))
 
                 sweep_index += 1
                 sweep_timer = 0
                 sweep_buffer = []
 
-                if sweep_index >= len(SWEEP_ANGLES):
+                if sweep_index >= len(sweep_pending):
                     sweep_active = False
                     print("--- Sweep Complete ---")
                 else:
-                    reset_simulation(hard=False)
-                    temp_cyl = np.zeros((WIDTH, HEIGHT), dtype=bool)
-                    stamp_airfoil(temp_cyl, current_naca, WIDTH//2,
-                                  HEIGHT//2, WIDTH//3, SWEEP_ANGLES[sweep_index])
-                    fluid.cylinder.from_numpy(temp_cyl.astype(int))
+                    start_sweep_point(sweep_pending[sweep_index])
 
     # Render
     ti.sync()
@@ -262,21 +475,41 @@ while running:
         if graph_expansion < graph_target_state:
             graph_expansion = graph_target_state
 
-    if view_mode == 2:
-        if not paused:
-            particles.update(fluid.u, fluid.cylinder)
-        particles.render(fluid.u, fluid.cylinder, 0.1)
-        particles.export_visuals(part_arr)
-        pygame.surfarray.blit_array(part_surf, part_arr)
-        screen.blit(part_surf, (0, 0))
+    # While paused the flow image is frozen, so only the HUD needs redrawing
+    view_dirty = not paused or view_mode != last_view_mode
+    last_view_mode = view_mode
+
+    if view_dirty:
+        # rho/u once per frame rather than on every sub-step
+        fluid.update_macros()
+        if view_mode == 2:
+            if not paused:
+                particles.update(fluid.u, fluid.cylinder)
+            particles.render(fluid.u, fluid.cylinder, 0.1)
+            particles.export_visuals(part_arr)
+            pygame.surfarray.blit_array(part_surf, part_arr)
+            bg_surf = part_surf
+
+        else:
+            if view_mode == 7:
+                # Advected once per frame over all of its sub-steps
+                if not paused:
+                    smoke.update(fluid.u, fluid.cylinder, STEPS_PER_FRAME)
+                smoke.render(fluid.cylinder)
+                smoke.export_visuals(fluid_arr)
+            else:
+                fluid.render_visuals(view_mode)
+                fluid.export_visuals(fluid_arr)
+            pygame.surfarray.blit_array(fluid_surf, fluid_arr)
+            pygame.transform.scale(
+                fluid_surf, (DISPLAY_W, DISPLAY_H), scaled_surf)
+            bg_surf = scaled_surf
+
+        screen.blit(bg_surf, (0, 0))
 
     else:
-        fluid.render_visuals(view_mode)
-        fluid.export_visuals(fluid_arr)
-        pygame.surfarray.blit_array(fluid_surf, fluid_arr)
-        scaled_surf = pygame.transform.scale(
-            fluid_surf, (DISPLAY_W, DISPLAY_H))
-        screen.blit(scaled_surf, (0, 0))
+        for r in hud_rects:
+            screen.blit(bg_surf, r, r)
 
     # Stats & HUD
     total_frames += 1
@@ -287,7 +520,8 @@ while running:
     else:
         avg_fps = 0.0
 
-    mode_names = {0: "Curl", 1: "Speed", 2: "Particles", 3: "Pressure"}
+    mode_names = {0: "Curl", 1: "Speed", 2: "Particles", 3: "Pressure",
+                  4: "Mean Speed", 5: "Velocity RMS", 6: "Mean Curl", 7: "Smoke"}
     mode_str = mode_names.get(view_mode, "Unknown")
 
     sim_time_ratio = TARGET_FPS * dt
@@ -298,7 +532,7 @@ while running:
     if sweep_active:
         steps_left = (SWEEP_TIME_FIRST - sweep_timer)
         swp_rem_angle = steps_left / (TARGET_FPS * STEPS_PER_FRAME)
-        angles_left = len(SWEEP_ANGLES) - sweep_index - 1
+        angles_left = len(sweep_pending) - sweep_index - 1
         time_per_angle = SWEEP_TIME_FIRST / (TARGET_FPS * STEPS_PER_FRAME)
         swp_rem_total = swp_rem_angle + (angles_left * time_per_angle)
 
@@ -325,11 +559,20 @@ while running:
         'swp_rem_angle': swp_rem_angle,
         'avg_fps': int(avg_fps),
         'mode_str': mode_str,
-        'swp_rem_total': swp_rem_total
+        'swp_rem_total': swp_rem_total,
+        'recording': recorder is not None
     }
-    hud.render(screen, fluid, stats)
+    new_rects = hud.render(screen, fluid, stats)
+
+    if view_dirty:
+        pygame.display.flip()
+    else:
+        pygame.display.update(hud_rects + new_rects)
+    hud_rects = new_rects
 
-    pygame.display.flip()
     clock.tick(TARGET_FPS)
 
+if recorder is not None:
+    recorder.close()
+cache.close()
 pygame.quit()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import numbers
+import sqlite3
+import time
+
+from FluidTaichi import SOLVER_VERSION
+
+
+def canonical_config(config):
+    """
+    Normalises a run configuration so equivalent runs hash identically
+    (e.g. an angle of 5 and 5.0, or a tuple and a list).
+    """
+    out = {}
+    for k, v in config.items():
+        if isinstance(v, bool) or v is None or isinstance(v, str):
+            out[k] = v
+        elif isinstance(v, numbers.Number):
+            out[k] = round(float(v), 9)
+        elif isinstance(v, (list, tuple)):
+            out[k] = [round(float(x), 9) if isinstance(x, numbers.Number) and not isinstance(x, bool)
+                      else x for x in v]
+        else:
+            out[k] = str(v)
+    return out
+
+
+def config_key(config, version=SOLVER_VERSION):
+    payload = json.dumps({'solver_version': version, 'config': canonical_config(config)},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk store of simulated polar points, keyed by a hash of the full
+    geometry + solver configuration.
+    """
+
+    def __init__(self, path="results_cache.sqlite", version=SOLVER_VERSION):
+        self.path = path
+        self.version = version
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS points (
+                key TEXT PRIMARY KEY,
+                solver_version INTEGER NOT NULL,
+                config TEXT NOT NULL,
+                lift REAL NOT NULL,
+                drag REAL NOT NULL,
+                created REAL NOT NULL
+            )""")
+        self.db.commit()
+
+    def get(self, config):
+        row = self.db.execute(
+            "SELECT lift, drag FROM points WHERE key = ?",
+            (config_key(config, self.version),)).fetchone()
+        return row
+
+    def put(self, config, lift, drag):
+        self.db.execute(
+            "INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?, ?)",
+            (config_key(config, self.version), self.version,
+             json.dumps(canonical_config(config), sort_keys=True),
+             float(lift), float(drag), time.time()))
+        self.db.commit()
+
+    def missing(self, configs):
+        return [c for c in configs if self.get(c) is None]
+
+    def purge_stale(self):
+        """
+        Drops points simulated by a different solver version. They can never
+        be hit (the version is part of the key), so this only reclaims space.
+        """
+        cur = self.db.execute(
+            "DELETE FROM points WHERE solver_version != ?", (self.version,))
+        self.db.commit()
+        return cur.rowcount
+
+    def close(self):
+        self.db.close()
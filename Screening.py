@@ -0,0 +1,145 @@
+import argparse
+import csv
+import sys
+
+import SweepRunner
+from ResultCache import ResultCache
+
+# Cheap pass: 2x coarser grid at the full pass's Reynolds number (3x would
+# need viscosity 0.005, which is unstable), half the flow-throughs and few
+# angles. Steps, spool and filter are rescaled to the coarser lattice's
+# time step, as Benchmark.at_fixed_re does.
+_BASE = SweepRunner.DEFAULT_CONFIG
+COARSE_OVERRIDES = {
+    'width': _BASE['width'] // 2,
+    'height': _BASE['height'] // 2,
+    'viscosity': _BASE['viscosity'] / 2,
+    'sweep_steps': _BASE['sweep_steps'] // 4,
+    'spool_rate': _BASE['spool_rate'] * 2,
+    'smoothing_alpha': _BASE['smoothing_alpha'] * 2,
+}
+COARSE_ANGLES = [0.0, 2.5, 5.0, 7.5, 10.0]
+
+FULL_OVERRIDES = {}
+FULL_ANGLES = [float(a) for a in range(-5, 16)]
+
+
+def expand_catalogue(spec, min_thickness=6):
+    """
+    Accepts a list of codes, or a "start-end" string covering every 4-digit
+    code in between (e.g. "0006-4415"). Codes with camber but no camber
+    position, or thinner than `min_thickness` percent, are skipped.
+    """
+    if isinstance(spec, str):
+        spec = [spec]
+
+    codes = []
+    for item in spec:
+        if '-' in item:
+            lo, hi = item.split('-')
+            candidates = [f"{n:04d}" for n in range(int(lo), int(hi) + 1)]
+        else:
+            candidates = [item]
+
+        for code in candidates:
+            m, p, t = int(code[0]), int(code[1]), int(code[2:])
+            if t < min_thickness or (m > 0 and p == 0) or (m == 0 and p > 0):
+                continue
+            if code not in codes:
+                codes.append(code)
+    return codes
+
+
+def max_ld(points, min_drag=0.001):
+    """
+    points: [(config, lift, drag)] -> (best L/D, angle). Points with drag
+    below min_drag (zero or negative drag is unphysical and turns up on
+    coarse grids) are skipped; (None, None) if none are left.
+    """
+    valid = [p for p in points if p[2] > min_drag]
+    if not valid:
+        return None, None
+    best = max(valid, key=lambda x: x[1] / x[2])
+    return best[1] / best[2], best[0]['angle']
+
+
+def format_ld(ld, angle, width):
+    if ld is None:
+        return f"{'-':>{width}} {'-':>6}"
+    return f"{ld:{width}.2f} {angle:5.1f}°"
+
+
+def ld_order(ld):
+    # Sort key: highest L/D first, airfoils without a valid point last
+    return (ld is None, -ld if ld is not None else 0.0)
+
+
+def polar(code, angles, overrides, cache):
+    configs = [SweepRunner.make_config(naca=code, angle=a, **overrides) for a in angles]
+    return SweepRunner.run_polar(configs, cache)
+
+
+def screen(codes, top_k=5, cache=None):
+    """
+    Ranks every code with a coarse, short polar, then re-runs only the
+    top_k at full fidelity. Returns rows sorted by final L/D.
+    """
+    coarse = []
+    for n, code in enumerate(codes):
+        ld, angle = max_ld(polar(code, COARSE_ANGLES, COARSE_OVERRIDES, cache))
+        coarse.append((ld, angle, code))
+        print(f"[coarse {n+1}/{len(codes)}] NACA {code}: L/D {format_ld(ld, angle, 0)}")
+
+    coarse.sort(key=lambda c: ld_order(c[0]))
+
+    rows = []
+    for rank, (ld, angle, code) in enumerate(coarse):
+        row = {'naca': code, 'coarse_ld': ld, 'coarse_angle': angle,
+               'coarse_rank': rank + 1, 'full_ld': None, 'full_angle': None}
+        if rank < top_k:
+            points = polar(code, FULL_ANGLES, FULL_OVERRIDES, cache)
+            row['full_ld'], row['full_angle'] = max_ld(points)
+            print(f"[full {rank+1}/{top_k}] NACA {code}: L/D "
+                  f"{format_ld(row['full_ld'], row['full_angle'], 0)}")
+        rows.append(row)
+
+    rows.sort(key=lambda r: (r['full_ld'] is None,) + ld_order(
+        r['full_ld'] if r['full_ld'] is not None else r['coarse_ld']))
+    return rows
+
+
+def print_table(rows):
+    print(f"{'Rank':>4}  {'NACA':<6} {'Full L/D':>9} {'@':>6}  {'Coarse L/D':>10} {'@':>6}")
+    for n, r in enumerate(rows):
+        print(f"{n+1:>4}  {r['naca']:<6} {format_ld(r['full_ld'], r['full_angle'], 9)}  "
+              f"{format_ld(r['coarse_ld'], r['coarse_angle'], 10)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen a catalogue of NACA 4-digit airfoils")
+    parser.add_argument("codes", nargs="+", help="codes or ranges, e.g. 2412 0006-4415")
+    parser.add_argument("--top", type=int, default=5, help="candidates promoted to full fidelity")
+    parser.add_argument("--min-thickness", type=int, default=6)
+    parser.add_argument("--out", default="screening.csv")
+    parser.add_argument("--cache", default="results_cache.sqlite")
+    args = parser.parse_args()
+
+    codes = expand_catalogue(args.codes, args.min_thickness)
+    if not codes:
+        print(f"No airfoils to screen: every code in {' '.join(args.codes)} was filtered out")
+        sys.exit(2)
+    print(f"Screening {len(codes)} airfoils, promoting top {args.top}")
+
+    SweepRunner.init_backend()
+    rows = screen(codes, args.top, ResultCache(args.cache))
+
+    with open(args.out, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
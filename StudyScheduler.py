@@ -0,0 +1,248 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import SweepRunner
+from ResultCache import ResultCache, config_key
+
+CSV_COLUMNS = ['naca', 'angle', 'real_air_speed', 'reynolds', 'width', 'height',
+               'viscosity', 'lift', 'drag', 'cl', 'cd', 'wall_time', 'cached']
+
+# Config keys set by a study axis, which overrides may not repeat
+AXIS_KEYS = {'naca': 'naca', 'angle': 'angles', 'width': 'resolutions',
+             'height': 'resolutions', 'real_air_speed': 'wind_speeds'}
+
+
+def expand_angles(spec):
+    """
+    Accepts a list of angles or a {"start", "stop", "step"} range (stop
+    inclusive).
+    """
+    if isinstance(spec, dict):
+        step = spec.get('step', 1)
+        return [float(a) for a in np.arange(spec['start'], spec['stop'] + step*0.5, step)]
+    return [float(a) for a in spec]
+
+
+def expand_study(study):
+    """
+    Expands a declarative study into (priority, config) jobs.
+
+    A study is a dict, or a list of dicts, with keys:
+        naca        - list of 4-digit codes
+        angles      - list of angles or {"start", "stop", "step"}
+        wind_speeds - list of free-stream speeds in m/s (optional, units only:
+                      each lattice case is simulated once and rescaled)
+        reynolds    - list of chord Reynolds numbers (optional, sets viscosity)
+        resolutions - list of [width, height] grids (optional)
+        priority    - lower runs first (optional, default 0)
+        overrides   - any other SweepRunner config keys (optional; keys set
+                      by the axes above raise ValueError)
+    """
+    blocks = study if isinstance(study, list) else [study]
+    jobs = []
+
+    for block in blocks:
+        base = SweepRunner.DEFAULT_CONFIG
+        speeds = block.get('wind_speeds', [base['real_air_speed']])
+        resolutions = block.get('resolutions', [[base['width'], base['height']]])
+        reynolds = block.get('reynolds', [None])
+        priority = block.get('priority', 0)
+        overrides = block.get('overrides', {})
+
+        clash = sorted(set(overrides) & set(AXIS_KEYS))
+        if clash:
+            axes = sorted({AXIS_KEYS[k] for k in clash})
+            raise ValueError(f"overrides cannot set {', '.join(clash)}; "
+                             f"set them with the study's {', '.join(axes)} instead")
+
+        for code, (w, h), speed, re, angle in itertools.product(
+                block['naca'], resolutions, speeds, reynolds, expand_angles(block['angles'])):
+            config = SweepRunner.make_config(
+                naca=str(code), angle=angle, width=int(w), height=int(h),
+                real_air_speed=float(speed), **overrides)
+
+            # Lattice Re = u * chord / nu, independent of the physical speed
+            if re is not None:
+                config['viscosity'] = config['lattice_speed'] * config['chord'] / re
+                if config['viscosity'] < 0.005:
+                    print(f"Warning: Re={re} on a {w}x{h} grid gives viscosity "
+                          f"{config['viscosity']:.4f}, likely unstable")
+
+            jobs.append((priority, config))
+
+    return jobs
+
+
+def study_id(study, out_csv):
+    """
+    Identifies one study run: the same study written to the same CSV.
+    """
+    payload = json.dumps({'study': study, 'out': os.path.abspath(out_csv)},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class WorkQueue:
+    """
+    Priority queue of point jobs persisted to SQLite so an interrupted study
+    resumes where it stopped. Jobs are scoped to one study, so studies that
+    share points each get every row in their own output.
+    """
+
+    def __init__(self, path, study):
+        self.db = sqlite3.connect(path)
+        self.study = study
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS study_jobs (
+                study TEXT NOT NULL,
+                key TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                config TEXT NOT NULL,
+                status TEXT NOT NULL,
+                PRIMARY KEY (study, key)
+            )""")
+        self.heap = []
+
+    def submit(self, jobs, restart=False):
+        """
+        Adds the study's jobs and queues everything not yet done: new jobs,
+        jobs left running by a crash and failed jobs. With `restart` the
+        finished ones are queued again too.
+        """
+        seq = self.db.execute("SELECT COALESCE(MAX(seq), -1) FROM study_jobs WHERE study = ?",
+                              (self.study,)).fetchone()[0] + 1
+        added = 0
+        for priority, config in jobs:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO study_jobs VALUES (?, ?, ?, ?, ?, 'pending')",
+                (self.study, config_key(config), priority, seq, json.dumps(config)))
+            if cur.rowcount:
+                seq += 1
+                added += 1
+
+        retry = "status != 'pending'" if restart else "status IN ('running', 'failed')"
+        self.db.execute(f"UPDATE study_jobs SET status = 'pending' WHERE study = ? AND {retry}",
+                        (self.study,))
+        self.db.commit()
+
+        self.heap = []
+        for key, priority, seq, config in self.db.execute(
+                "SELECT key, priority, seq, config FROM study_jobs "
+                "WHERE study = ? AND status = 'pending'", (self.study,)):
+            heapq.heappush(self.heap, (priority, seq, key, json.loads(config)))
+        return added
+
+    def pop(self):
+        if not self.heap:
+            return None
+        _, _, key, config = heapq.heappop(self.heap)
+        self._set(key, 'running')
+        return key, config
+
+    def done(self, key):
+        self._set(key, 'done')
+
+    def failed(self, key):
+        self._set(key, 'failed')
+
+    def _set(self, key, status):
+        self.db.execute("UPDATE study_jobs SET status = ? WHERE study = ? AND key = ?",
+                        (status, self.study, key))
+        self.db.commit()
+
+    def __len__(self):
+        return len(self.heap)
+
+
+def run_study(study, out_csv, queue_path="study_queue.sqlite", cache=None):
+    """
+    Jobs that differ only in wind speed share one simulation: the lattice
+    result is kept (and cached) under lattice_config and rescaled per job.
+    """
+    new_file = not os.path.exists(out_csv)
+    queue = WorkQueue(queue_path, study_id(study, out_csv))
+    simulated = {}
+    # A missing CSV has lost the finished rows, so run the whole study again
+    added = queue.submit(expand_study(study), restart=new_file)
+    print(f"Study: {added} new jobs, {len(queue)} pending")
+
+    with open(out_csv, "a", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=CSV_COLUMNS)
+        if new_file:
+            writer.writeheader()
+
+        t0 = time.perf_counter()
+        done = 0
+        while True:
+            job = queue.pop()
+            if job is None:
+                break
+            key, config = job
+
+            try:
+                base = SweepRunner.lattice_config(config)
+                base_key = config_key(base)
+                hit = simulated.get(base_key)
+                if hit is None and cache is not None:
+                    hit = cache.get(base)
+                if hit is None:
+                    res = SweepRunner.run_point(base)
+                    lift, drag, wall = res['lift'], res['drag'], res['wall_time']
+                    simulated[base_key] = (lift, drag)
+                    if cache is not None:
+                        cache.put(base, lift, drag)
+                else:
+                    lift, drag, wall = hit[0], hit[1], 0.0
+                lift, drag = SweepRunner.rescale_forces(config, base, lift, drag)
+            except Exception as e:
+                print(f"Job {config['naca']} {config['angle']}° failed: {e}")
+                queue.failed(key)
+                continue
+
+            cl, cd = SweepRunner.coefficients(config, lift, drag)
+            re = config['lattice_speed'] * config['chord'] / config['viscosity']
+            writer.writerow({
+                'naca': config['naca'], 'angle': config['angle'],
+                'real_air_speed': config['real_air_speed'], 'reynolds': round(re, 1),
+                'width': config['width'], 'height': config['height'],
+                'viscosity': config['viscosity'], 'lift': lift, 'drag': drag,
+                'cl': cl, 'cd': cd, 'wall_time': wall, 'cached': hit is not None,
+            })
+            fh.flush()
+            queue.done(key)
+
+            done += 1
+            elapsed = time.perf_counter() - t0
+            print(f"[{done}/{done + len(queue)}] {config['naca']} {config['angle']}° "
+                  f"{config['width']}x{config['height']}: Cl={cl:.3f} Cd={cd:.4f} "
+                  f"({elapsed:.0f}s elapsed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a parametric airfoil study")
+    parser.add_argument("study", help="JSON study description")
+    parser.add_argument("--out", default="study_results.csv")
+    parser.add_argument("--queue", default="study_queue.sqlite")
+    parser.add_argument("--cache", default="results_cache.sqlite")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.study) as fh:
+        study = json.load(fh)
+
+    SweepRunner.init_backend()
+    cache = None if args.no_cache else ResultCache(args.cache)
+    run_study(study, args.out, args.queue, cache)
+
+
+if __name__ == "__main__":
+    main()
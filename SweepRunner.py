@@ -0,0 +1,373 @@
+import time
+import numpy as np
+import taichi as ti
+from FluidTaichi import FluidTaichi
+from RefinedFluidTaichi import RefinedFluidTaichi, default_patch
+from AirfoilGenerator import stamp_airfoil, airfoil_outline
+
+# Mirrors the interactive settings in Main.py so both share cached points
+DEFAULT_CONFIG = {
+    'naca': "0012",
+    'angle': 0.0,
+    'width': 600,
+    'height': 250,
+    'chord': 200,
+    'viscosity': 0.015,
+    'outlet': "zero_gradient",
+    'walls': "slip",
+    'sparse': False,
+    'refine_ratio': 1,
+    'warm_start_ratio': 1,
+    'warm_start_steps': 0,
+    'warm_settle_steps': 0,
+    'lattice_speed': 0.1,
+    'real_air_speed': 30.0,
+    'tunnel_height_m': 1.25,
+    'air_density': 1.225,
+    'spool_rate': 0.001,
+    'smoothing_alpha': 0.005,
+    'steps_per_frame': 4,
+    'sweep_steps': 150 * 60 * 4,
+}
+
+# Pitching ramp: ~1800 steps per degree keeps the reduced pitch rate near
+# 0.01 at the default settings, i.e. close to quasi-steady
+RAMP_RATE = 1.0 / 1800
+RAMP_EVERY = 20
+
+_fluids = {}
+
+
+def init_backend():
+    ti.init(arch=ti.gpu)
+
+
+def make_config(**overrides):
+    config = dict(DEFAULT_CONFIG)
+    config.update(overrides)
+    if 'chord' not in overrides:
+        config['chord'] = config['width'] // 3
+    return config
+
+
+# Unit conversion only: runs that differ just in these simulate the same flow
+DIMENSIONAL_KEYS = ('real_air_speed', 'tunnel_height_m', 'air_density')
+
+
+def lattice_config(config):
+    """
+    The config with its DIMENSIONAL_KEYS reset to the defaults, so all
+    wind speeds of one lattice case share a simulation and a cache entry.
+    """
+    return dict(config, **{k: DEFAULT_CONFIG[k] for k in DIMENSIONAL_KEYS})
+
+
+def rescale_forces(config, lattice, lift, drag):
+    """
+    Converts forces recorded for `lattice` into the units of `config`.
+    """
+    s = force_scale(config) / force_scale(lattice)
+    return lift * s, drag * s
+
+
+def force_scale(config):
+    dx = config['tunnel_height_m'] / config['height']
+    dt = (config['lattice_speed'] * dx) / config['real_air_speed']
+    return config['air_density'] * (dx**3) / (dt**2)
+
+
+def coefficients(config, lift, drag):
+    """
+    Converts forces (N per metre span) into Cl / Cd.
+    """
+    dx = config['tunnel_height_m'] / config['height']
+    q = 0.5 * config['air_density'] * config['real_air_speed']**2
+    ref = q * config['chord'] * dx
+    return lift / ref, drag / ref
+
+
+def get_fluid(config):
+    # Taichi fields are never freed, so reuse one solver per grid
+    key = (config['width'], config['height'], config['chord'], config['viscosity'],
+           config['outlet'], config['walls'], config['sparse'], config['refine_ratio'])
+    if key not in _fluids:
+        w, h = config['width'], config['height']
+        if config['refine_ratio'] > 1:
+            _fluids[key] = RefinedFluidTaichi(
+                w, h, default_patch(w, h, config['chord']), ratio=config['refine_ratio'],
+                viscosity=config['viscosity'], outlet=config['outlet'],
+                walls=config['walls'], sparse=config['sparse'], lazy_macros=True)
+        else:
+            # Headless runs never read rho/u, so skip storing them every step
+            _fluids[key] = FluidTaichi(
+                w, h, viscosity=config['viscosity'], outlet=config['outlet'],
+                walls=config['walls'], sparse=config['sparse'], lazy_macros=True)
+    return _fluids[key]
+
+
+def place_airfoil(fluid, config):
+    w, h = config['width'], config['height']
+    temp_cyl = np.zeros((w, h), dtype=bool)
+    stamp_airfoil(temp_cyl, config['naca'], w//2, h//2,
+                  config['chord'], config['angle'])
+    if config['refine_ratio'] > 1:
+        shape, fcx, fcy, fchord = fluid.fine_frame(w//2, h//2, config['chord'])
+        fine_cyl = np.zeros(shape, dtype=bool)
+        stamp_airfoil(fine_cyl, config['naca'], fcx, fcy, fchord, config['angle'])
+        fluid.set_obstacle(temp_cyl, fine_cyl)
+    else:
+        fluid.set_obstacle(temp_cyl)
+
+
+def set_body(fluid, config):
+    """
+    Registers the airfoil for on-device rotation about its quarter chord.
+    """
+    w, h = config['width'], config['height']
+    fluid.set_body(airfoil_outline(config['naca'], config['chord']), w//2, h//2)
+
+
+class PitchRamp:
+    """
+    Angle schedule and force bins for a continuous pitching sweep. The body
+    holds the first angle for `settle` steps, then pitches through the
+    range at `rate` degrees per step (and back down again if `reverse`),
+    restamped every `every` steps. Forces are binned by the angle of the
+    current mask, to the nearest entry in `angles`. The ramp overshoots
+    both ends by half a bin so the end bins are fully covered.
+    """
+
+    def __init__(self, angles, rate=RAMP_RATE, every=RAMP_EVERY, settle=0, reverse=False):
+        self.angles = sorted(angles)
+        self.rate = rate
+        self.every = every
+        self.settle = settle
+        self.reverse = reverse
+
+        spacing = np.diff(self.angles).min() if len(self.angles) > 1 else 1.0
+        self.half_bin = 0.5 * spacing
+        self.start = self.angles[0] - self.half_bin
+        self.stop = self.angles[-1] + self.half_bin
+        self.ramp_steps = int(round((self.stop - self.start) / rate))
+        self.total_steps = settle + self.ramp_steps * (2 if reverse else 1)
+
+        self.step_count = 0
+        self.body_angle = self.start
+        self.bins = {}
+
+    @property
+    def done(self):
+        return self.step_count >= self.total_steps
+
+    def direction(self):
+        return "up" if self.step_count - self.settle <= self.ramp_steps else "down"
+
+    def angle_at(self, step):
+        t = step - self.settle
+        if t <= 0:
+            return self.start
+        if t <= self.ramp_steps:
+            return min(self.start + t * self.rate, self.stop)
+        return max(self.stop - (t - self.ramp_steps) * self.rate, self.start)
+
+    def advance(self, lift, drag):
+        """
+        Bins one step's forces (N per metre, lift positive up) and moves the
+        schedule on. Returns the angle to restamp the body at, or None.
+        """
+        if self.step_count >= self.settle:
+            nearest = min(self.angles, key=lambda a: abs(a - self.body_angle))
+            if abs(nearest - self.body_angle) <= self.half_bin:
+                b = self.bins.setdefault((self.direction(), nearest), [0.0, 0.0, 0])
+                b[0] += lift
+                b[1] += drag
+                b[2] += 1
+
+        self.step_count += 1
+        if self.step_count > self.settle and self.step_count % self.every == 0:
+            self.body_angle = self.angle_at(self.step_count)
+            return self.body_angle
+        return None
+
+    def polar(self, direction="up"):
+        """
+        [(angle, lift, drag)] sorted by angle, for one ramp direction or
+        "mean". Averaging the two directions cancels the first-order lag of
+        the ramp, so "mean" is the best quasi-steady estimate.
+        """
+        if direction == "mean":
+            down = {a: (l, d) for a, l, d in self.polar("down")}
+            return [(a, 0.5 * (l + down[a][0]), 0.5 * (d + down[a][1]))
+                    for a, l, d in self.polar("up") if a in down]
+
+        items = sorted(self.bins.items(), key=lambda x: x[0][1])
+        return [(a, l / n, d / n) for (dirn, a), (l, d, n) in items if dirn == direction]
+
+    def hysteresis(self):
+        """
+        [(angle, lift_up - lift_down, drag_up - drag_down)] where both
+        directions covered the angle.
+        """
+        down = {a: (l, d) for a, l, d in self.polar("down")}
+        return [(a, l - down[a][0], d - down[a][1]) for a, l, d in self.polar("up") if a in down]
+
+
+def sweep_schedule(config):
+    """
+    (settle, target) step counts for one point: forces are averaged from
+    step settle to target. A cold start settles for half of sweep_steps; a
+    warm-started point only re-settles for warm_settle_steps before the same
+    averaging window.
+    """
+    settle = config['sweep_steps'] // 2
+    window = config['sweep_steps'] - settle
+    if config['warm_start_ratio'] > 1:
+        settle = config['warm_settle_steps']
+    return settle, settle + window
+
+
+def warm_start(config):
+    """
+    Solves the same case on a grid `warm_start_ratio` times coarser for
+    `warm_start_steps` steps and returns that solver, ready to be
+    prolongated onto the target with prolongate_from. The viscosity and
+    spool rate are rescaled so the coarse grid runs at the target's
+    Reynolds number and spools up over the same convective time.
+    """
+    r = config['warm_start_ratio']
+    coarse = dict(config, width=config['width'] // r, height=config['height'] // r,
+                  chord=config['chord'] // r, viscosity=config['viscosity'] / r,
+                  spool_rate=config['spool_rate'] * r, refine_ratio=1, sparse=False,
+                  warm_start_ratio=1, warm_start_steps=0, warm_settle_steps=0)
+    if coarse['viscosity'] < 0.005:
+        print(f"Warning: warm start at ratio {r} gives viscosity "
+              f"{coarse['viscosity']:.4f}, likely unstable")
+
+    fluid = get_fluid(coarse)
+    fluid.reset()
+    place_airfoil(fluid, coarse)
+
+    lb_speed = 0.0
+    for _ in range(config['warm_start_steps']):
+        if lb_speed < coarse['lattice_speed']:
+            lb_speed += coarse['spool_rate']
+        fluid.set_inlet(lb_speed)
+        fluid.step()
+    return fluid
+
+
+def run_point(config):
+    """
+    Runs one angle headless, exactly as a single step of the 'D' sweep does,
+    and returns the averaged forces plus cost figures.
+    """
+    t0 = time.perf_counter()
+    warm = None
+    if config['warm_start_ratio'] > 1:
+        warm = warm_start(config)
+
+    fluid = get_fluid(config)
+    fluid.reset()
+    place_airfoil(fluid, config)
+
+    alpha = config['smoothing_alpha']
+    spf = config['steps_per_frame']
+    settle, target = sweep_schedule(config)
+    scale = force_scale(config)
+
+    lb_speed = 0.0
+    if warm is not None:
+        fluid.prolongate_from(warm)
+        lb_speed = config['lattice_speed']
+
+    smooth_drag, smooth_lift = 0.0, 0.0
+    timer, steps = 0, 0
+    buffer = []
+
+    while timer <= target:
+        for _ in range(spf):
+            if lb_speed < config['lattice_speed']:
+                lb_speed += config['spool_rate']
+            fluid.set_inlet(lb_speed)
+            d, l, _ = fluid.step()
+            smooth_drag = (d * alpha) + (smooth_drag * (1-alpha))
+            smooth_lift = (l * alpha) + (smooth_lift * (1-alpha))
+        steps += spf
+        timer += spf
+
+        if timer > settle:
+            buffer.append((-smooth_lift*scale, smooth_drag*scale))
+
+    ti.sync()
+    wall_time = time.perf_counter() - t0
+
+    lift = sum(b[0] for b in buffer) / len(buffer)
+    drag = sum(b[1] for b in buffer) / len(buffer)
+
+    cells = config['width'] * config['height']
+    if config['refine_ratio'] > 1:
+        # Fine cells are updated ratio times per coarse step
+        cells += fluid.fine.width * fluid.fine.height * config['refine_ratio']
+
+    updates = cells * steps
+    if warm is not None:
+        updates += warm.width * warm.height * config['warm_start_steps']
+
+    return {
+        'lift': lift,
+        'drag': drag,
+        'steps': steps,
+        'cells': cells,
+        'lattice_updates': updates,
+        'wall_time': wall_time,
+    }
+
+
+def run_ramp(config, angles, rate=RAMP_RATE, every=RAMP_EVERY, reverse=False):
+    """
+    Runs a whole polar as one continuous pitching ramp. The flow develops at
+    the start of the ramp for half of `sweep_steps`, then the airfoil rotates on
+    the device. Returns the finished PitchRamp (see polar / hysteresis).
+    Ramp results depend on the pitch rate, so they are not cached.
+    """
+    ramp = PitchRamp(angles, rate, every, settle=config['sweep_steps'] // 2, reverse=reverse)
+
+    config = dict(config, angle=ramp.start)
+    fluid = get_fluid(config)
+    fluid.reset()
+    place_airfoil(fluid, config)
+    set_body(fluid, config)
+    scale = force_scale(config)
+    lb_speed = 0.0
+
+    while not ramp.done:
+        if lb_speed < config['lattice_speed']:
+            lb_speed += config['spool_rate']
+        fluid.set_inlet(lb_speed)
+        d, l, _ = fluid.step()
+        angle = ramp.advance(-l * scale, d * scale)
+        if angle is not None:
+            fluid.rotate_body(angle)
+
+    return ramp
+
+
+def run_polar(configs, cache=None):
+    """
+    Runs a list of point configs, simulating only those missing from the
+    cache. Returns (config, lift, drag) for every point in input order.
+    """
+    out = []
+    for config in configs:
+        base = lattice_config(config)
+        hit = cache.get(base) if cache is not None else None
+        if hit is None:
+            res = run_point(base)
+            hit = (res['lift'], res['drag'])
+            if cache is not None:
+                cache.put(base, *hit)
+            print(
+                f"Recorded {config['naca']} {config['angle']}°: L={hit[0]:.2f} D={hit[1]:.2f}")
+        lift, drag = rescale_forces(config, base, *hit)
+        out.append((config, lift, drag))
+    return out